@@ -1,12 +1,17 @@
+import re
+import threading
+
 from flask import Flask, current_app, redirect, url_for, g, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
+from markupsafe import Markup
 
 from config import Config
+from .utils import TTLCache
 
 from sqlalchemy import create_engine
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import selectinload
 
 try:
     # Flask-SQLAlchemy 3.x
@@ -14,7 +19,77 @@ try:
 except ImportError:
     # Flask-SQLAlchemy 2.5.x
     from flask_sqlalchemy import SignallingSession as BaseFSASession
+# db_uri -> Engine (one connection pool per tenant DB for the process lifetime)
 _TENANT_ENGINES = {}
+_TENANT_ENGINES_LOCK = threading.Lock()
+
+# (tenant_slug, perm_codes frozenset) -> filtered sidebar list
+_SIDEBAR_CACHE = TTLCache(ttl=300)
+
+# (tenant_slug, perm_codes, endpoint) -> rendered sidebar Markup
+_SIDEBAR_HTML_CACHE = TTLCache(ttl=300)
+
+
+# tenant slug -> (db_uri, logo) (db_uri "" = no active tenant), avoids a platform DB hit per request
+_TENANT_CACHE = TTLCache(ttl=60)
+
+# requests that never need a tenant DB (platform UI, static files, browser probes)
+_NO_TENANT_PREFIXES = ("/platform", "/static", "/assets")
+_NO_TENANT_PATHS = frozenset({"/favicon.ico", "/robots.txt"})
+_ASSET_EXTS = frozenset({"css", "js", "map", "png", "jpg", "jpeg", "gif", "svg", "ico", "webp", "woff", "woff2", "ttf"})
+
+
+def _is_no_tenant_path(path: str) -> bool:
+    if path in _NO_TENANT_PATHS or path.startswith(_NO_TENANT_PREFIXES):
+        return True
+    tail = path.rsplit("/", 1)[-1]
+    return "." in tail and tail.rsplit(".", 1)[-1].lower() in _ASSET_EXTS
+
+
+# endpoint -> resolved path (sidebar endpoints take no URL arguments)
+_ENDPOINT_URLS = {}
+
+
+class _LazySidebar:
+    """Sidebar HTML that is only rendered when a template outputs it (base.html does)."""
+
+    def __init__(self, render):
+        self._render = render
+
+    def __html__(self):
+        return self._render()
+
+    __str__ = __html__
+
+
+def get_tenant_engine(db_uri: str):
+    engine = _TENANT_ENGINES.get(db_uri)
+    if engine is None:
+        with _TENANT_ENGINES_LOCK:
+            engine = _TENANT_ENGINES.get(db_uri)
+            if engine is None:
+                engine = create_engine(db_uri, pool_pre_ping=True, pool_recycle=1800)
+                _TENANT_ENGINES[db_uri] = engine
+    return engine
+
+
+def dispose_tenant_engine(db_uri: str):
+    """Drop the pooled engine for a tenant DB (e.g. after its db_uri changed)."""
+    with _TENANT_ENGINES_LOCK:
+        engine = _TENANT_ENGINES.pop(db_uri, None)
+    if engine is not None:
+        engine.dispose()
+
+
+def invalidate_tenant_cache():
+    """Call after any Tenant create/update (slug, db_uri, is_active)."""
+    _TENANT_CACHE.clear()
+
+
+def invalidate_sidebar_cache():
+    """Call after any Menu/SubMenu or role-permission change."""
+    _SIDEBAR_CACHE.clear()
+    _SIDEBAR_HTML_CACHE.clear()
 
 class TenantRoutingSession(BaseFSASession):
     def get_bind(self, mapper=None, clause=None, **kw):
@@ -48,6 +123,58 @@ db = TenantSQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
 
+# Blueprints (imported once at module load; they need db/login_manager above)
+from .platform_models import Tenant  # noqa: E402  bind_key="platform"
+from .auth.routes import auth_bp  # noqa: E402
+from .admin.routes import admin_bp  # noqa: E402
+from .leads.routes import leads_bp  # noqa: E402
+from .pipeline.routes import pipeline_bp  # noqa: E402
+from .quotes.routes import quotes_bp  # noqa: E402
+from .admin.user_master import user_master_bp  # noqa: E402
+from .admin.designations import designations_bp  # noqa: E402
+from .admin.rbac_master import rbac_bp  # noqa: E402
+from .clients.routes import clients_bp  # noqa: E402
+from .payments.routes import payments_bp  # noqa: E402
+from .admin.industries import industries_bp  # noqa: E402
+from .company_master.routes import company_bp  # noqa: E402
+from .admin.services import admin_services_bp  # noqa: E402
+from .proforma.routes import proforma_bp  # noqa: E402
+from .invoices.routes import invoices_bp  # noqa: E402
+from .admin.menu_master import menu_bp  # noqa: E402
+from .currencies.routes import currencies_bp  # noqa: E402
+from .admin.reports import reports_bp  # noqa: E402
+from .projects.routes import projects_bp  # noqa: E402
+from .admin.margin_settings import margin_settings_bp  # noqa: E402
+from .platform.routes import platform_bp  # noqa: E402
+from .cli import register_cli  # noqa: E402
+from .commands.tenant_seed import register_tenant_seed  # noqa: E402
+from .commands.reset_db import register_reset_db  # noqa: E402
+
+# (blueprint, url_prefix) in registration order
+_BLUEPRINTS = (
+    (platform_bp, None),
+    (margin_settings_bp, None),
+    (projects_bp, None),
+    (reports_bp, None),
+    (currencies_bp, None),
+    (menu_bp, "/admin"),
+    (proforma_bp, None),
+    (invoices_bp, None),
+    (admin_services_bp, "/admin"),
+    (company_bp, None),
+    (industries_bp, "/admin"),
+    (payments_bp, None),
+    (clients_bp, "/clients"),
+    (rbac_bp, "/admin"),
+    (designations_bp, "/admin"),
+    (user_master_bp, "/admin"),
+    (quotes_bp, "/quotes"),
+    (pipeline_bp, "/pipeline"),
+    (leads_bp, "/leads"),
+    (auth_bp, None),
+    (admin_bp, "/admin"),
+)
+
 
 def create_app():
     app = Flask(__name__)
@@ -56,45 +183,28 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
 
-    from .platform_models import Tenant  # bind_key="platform"
-
-    def _extract_subdomain(host: str, base_domain: str):
-        host = (host or "").split(":")[0].lower()
-        base_domain = (base_domain or "").lower()
-
-        # localhost: no subdomain routing
-        if host == "localhost" or host.endswith(".localhost") or host.startswith("127."):
+    # "<slug>.<BASE_DOMAIN>[:port]" -> slug, compiled once per app
+    base_domain = (app.config.get("BASE_DOMAIN") or "").strip().lower()
+    host_re = (
+        re.compile(rf"^(?P<slug>[a-z0-9-]+)\.{re.escape(base_domain)}(?::\d+)?$", re.I)
+        if base_domain else None
+    )
+
+    def _get_subdomain_slug():
+        host = request.host
+        # dev hot path: plain localhost / loopback never carries a tenant
+        if host_re is None or host.startswith(("localhost", "127.")):
             return None
-
-        if base_domain and host.endswith("." + base_domain):
-            prefix = host[: -(len(base_domain) + 1)]
-            if prefix and "." not in prefix:
-                return prefix
-
-        parts = host.split(".")
-        if len(parts) >= 3:
-            return parts[0]
-        return None
-
-    from flask import request, g
-    from .platform_models import Tenant
-
-    def _get_subdomain_slug(app):
-        host = request.host.split(":")[0]  # remove port
-        base = app.config.get("BASE_DOMAIN")
-
-        # If BASE_DOMAIN is set and host endswith it, try extract subdomain
-        if base and host.endswith(base) and host != base:
-            return host[: -(len(base) + 1)]  # remove ".base"
-        return None
+        m = host_re.match(host)
+        return m.group("slug").lower() if m else None
 
     @app.before_request
     def bind_tenant_database():
-        # ✅ Do NOT force tenant binding for platform routes
-        if request.path.startswith("/platform") or request.path.startswith("/static"):
+        # ✅ Do NOT force tenant binding for platform routes / static assets
+        if _is_no_tenant_path(request.path):
             return
 
-        slug = _get_subdomain_slug(current_app)
+        slug = _get_subdomain_slug()
 
         # ✅ if no subdomain, use DEFAULT_TENANT_SLUG (optional)
         if not slug:
@@ -105,84 +215,52 @@ def create_app():
             g.tenant_engine = None
             return
 
-        # ✅ Lookup tenant ONLY from platform bind
-        tenant = Tenant.query.filter_by(slug=slug, is_active=True).first()
-        if not tenant:
+        # ✅ Lookup tenant ONLY from platform bind (cached per slug for a short TTL)
+        cached = _TENANT_CACHE.get(slug)
+        if cached is None:
+            tenant = Tenant.query.filter_by(slug=slug, is_active=True).first()
+            cached = _TENANT_CACHE.set(slug, (tenant.db_uri, tenant.logo) if tenant else ("", None))
+        db_uri, logo = cached
+
+        if not db_uri:
             # In platform-only mode, you may want to redirect to platform tenants page instead
             g.tenant_engine = None
             return
 
-        g.tenant_engine = create_engine(tenant.db_uri, pool_pre_ping=True, pool_recycle=1800)
+        # ✅ resolved once per request; sidebar/branding/cache keys read these from g
+        g.tenant_slug = slug
+        g.tenant_logo = logo
+        g.tenant_engine = get_tenant_engine(db_uri)
+
+    @app.before_request
+    def load_perm_codes():
+        # runs after bind_tenant_database: roles/permissions live in the tenant DB
+        if _is_no_tenant_path(request.path):
+            return
+        if current_user.is_authenticated:
+            g.perm_codes = current_user.perm_codes
 
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
 
-    # Blueprints
-    from .auth.routes import auth_bp
-    from .admin.routes import admin_bp
-    from .leads.routes import leads_bp
-    from .pipeline.routes import pipeline_bp
-    from .quotes.routes import quotes_bp
-    from .admin.user_master import user_master_bp
-    from .admin.designations import designations_bp
-    from .admin.rbac_master import rbac_bp
-    from .clients.routes import clients_bp
-    from .cli import register_cli
-    from app.payments.routes import payments_bp
-    from .admin.industries import industries_bp
-    from app.company_master.routes import company_bp
-    from .admin.services import admin_services_bp
-    from app.proforma.routes import proforma_bp
-    from app.invoices.routes import invoices_bp
-    from .admin.menu_master import menu_bp
-    from .currencies.routes import currencies_bp
-    from .admin.reports import reports_bp
-    from app.projects.routes import projects_bp
-    from app.admin.margin_settings import margin_settings_bp
-    from .platform.routes import platform_bp
-    from .commands.tenant_seed import register_tenant_seed
-    from .commands.reset_db import register_reset_db
-
-    
-    app.register_blueprint(platform_bp)
-    app.register_blueprint(margin_settings_bp)
-    app.register_blueprint(projects_bp)
-    app.register_blueprint(reports_bp)
-    app.register_blueprint(currencies_bp)
-    app.register_blueprint(menu_bp, url_prefix="/admin")
-    app.register_blueprint(proforma_bp)
-    app.register_blueprint(invoices_bp)
-    app.register_blueprint(admin_services_bp, url_prefix="/admin")
-    app.register_blueprint(company_bp)
-    app.register_blueprint(industries_bp, url_prefix="/admin")
-    app.register_blueprint(payments_bp)
+    for bp, url_prefix in _BLUEPRINTS:
+        app.register_blueprint(bp, url_prefix=url_prefix)
 
     register_cli(app)
     register_tenant_seed(app)
     register_reset_db(app)
 
-    app.register_blueprint(clients_bp, url_prefix="/clients")
-    app.register_blueprint(rbac_bp, url_prefix="/admin")
-    app.register_blueprint(designations_bp, url_prefix="/admin")
-    app.register_blueprint(user_master_bp, url_prefix="/admin")
-    app.register_blueprint(quotes_bp, url_prefix="/quotes")
-    app.register_blueprint(pipeline_bp, url_prefix="/pipeline")
-    app.register_blueprint(leads_bp, url_prefix="/leads")
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(admin_bp, url_prefix="/admin")
-
     # Sidebar Menus
-    def _user_perm_codes(user):
-        if not user or not getattr(user, "role", None):
-            return set()
-        return set([p.code for p in (user.role.permissions or [])])
+    def _user_perm_codes():
+        return getattr(g, "perm_codes", frozenset())
 
     @app.context_processor
     def inject_tenant_branding():
         logo_url = None
 
-        if getattr(g, "tenant", None) and getattr(g.tenant, "logo", None):
-            logo_url = url_for("static", filename=f"tenant_logos/{g.tenant.logo}")
+        logo = getattr(g, "tenant_logo", None)
+        if logo:
+            logo_url = url_for("static", filename=f"tenant_logos/{logo}")
 
         # ✅ root / fallback logo
         if not logo_url:
@@ -191,19 +269,24 @@ def create_app():
         return dict(tenant_logo=logo_url)
 
     
-    @app.context_processor
-    def inject_sidebar_menus():
-        if not current_user.is_authenticated:
-            return {"sidebar_menus": []}
+    def _load_sidebar(perm_codes):
+        from .models import Menu
 
-        from .models import Menu, SubMenu
+        cache_key = (getattr(g, "tenant_slug", None), perm_codes)
+        cached = _SIDEBAR_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
 
-        perm_codes = _user_perm_codes(current_user)
-        menus = Menu.query.filter_by(is_active=True).order_by(Menu.sort_order.asc()).all()
+        # 2 queries total: menus + all their submenus (already ordered by sort_order)
+        menus = (Menu.query
+                 .options(selectinload(Menu.submenus))
+                 .filter_by(is_active=True)
+                 .order_by(Menu.sort_order.asc())
+                 .all())
 
         sidebar = []
         for m in menus:
-            subs = m.submenus.filter_by(is_active=True).order_by(SubMenu.sort_order.asc()).all()
+            subs = [s for s in m.submenus if s.is_active]
             visible_subs = []
 
             for s in subs:
@@ -213,7 +296,9 @@ def create_app():
                 href = "#"
                 try:
                     if s.endpoint:
-                        href = url_for(s.endpoint)
+                        href = _ENDPOINT_URLS.get(s.endpoint)
+                        if href is None:
+                            href = _ENDPOINT_URLS[s.endpoint] = url_for(s.endpoint)
                     elif s.url:
                         href = s.url
                 except Exception:
@@ -233,7 +318,33 @@ def create_app():
                     "submenus": visible_subs
                 })
 
-        return {"sidebar_menus": sidebar}
+        return _SIDEBAR_CACHE.set(cache_key, sidebar)
+
+    @app.context_processor
+    def inject_sidebar_menus():
+        # login pages, pdf_pending and the PDF HTML never show a sidebar
+        if not current_user.is_authenticated:
+            return {"sidebar_html": ""}
+
+        def render():
+            perm_codes = _user_perm_codes()
+            sidebar = _load_sidebar(perm_codes)
+
+            # Open menus / active links follow the endpoint (sidebar hrefs take no URL arguments),
+            # so one rendering per endpoint serves every request path that maps to it.
+            path = request.path or ""
+            ep = request.endpoint or ""
+            html_key = (getattr(g, "tenant_slug", None), perm_codes, ep)
+            html = _SIDEBAR_HTML_CACHE.get(html_key)
+            if html is None:
+                # render via jinja_env directly: render_template_string would re-enter this context processor
+                tpl = app.jinja_env.get_template("partials/sidebar.html")
+                html = _SIDEBAR_HTML_CACHE.set(
+                    html_key, Markup(tpl.render(sidebar_menus=sidebar, path=path, ep=ep))
+                )
+            return html
+
+        return {"sidebar_html": _LazySidebar(render)}
 
     @app.route("/")
     def home():
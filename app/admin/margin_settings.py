@@ -5,6 +5,7 @@ from flask_login import login_required, current_user
 from app import db
 from app.utils import require_perm
 from app.models import MarginSettings
+from app.services.margin import active_margin_settings, set_margin_threshold_cache
 
 margin_settings_bp = Blueprint("margin_settings", __name__, template_folder="../templates")
 
@@ -16,10 +17,8 @@ def _clean(s): return (s or "").strip()
 @login_required
 @require_perm("masters.manage")  # or create "margin_settings.manage"
 def margin_settings():
-    ms = (MarginSettings.query
-          .filter(MarginSettings.is_active == True)
-          .order_by(MarginSettings.id.desc())
-          .first())
+    # the same row get_margin_threshold_percent reads, so the edit and the cached value agree
+    ms = active_margin_settings()
 
     if not ms:
         ms = MarginSettings(threshold_percent=50.00, is_active=True)
@@ -41,6 +40,7 @@ def margin_settings():
         ms.threshold_percent = th
         ms.updated_by_id = current_user.id
         db.session.commit()
+        set_margin_threshold_cache(th)
 
         flash("Margin threshold updated ✅", "success")
         return redirect(url_for("margin_settings.margin_settings"))
@@ -1,7 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required
+from sqlalchemy.orm import selectinload
 
-from .. import db
+from .. import db, invalidate_sidebar_cache
 from ..utils import require_perm
 from ..models import Menu, SubMenu, Permission
 
@@ -10,115 +11,230 @@ menu_bp = Blueprint("menu_master", __name__, template_folder="../templates")
 def _clean(s):
     return (s or "").strip()
 
+
+def _back():
+    return redirect(url_for("menu_master.menu_management"))
+
+
+def _json_int(v):
+    """JSON number or digit string -> int; anything else (bools, floats, text) -> None."""
+    if isinstance(v, bool):
+        return None
+    if isinstance(v, int):
+        return v
+    if isinstance(v, str) and v.strip().isdigit():
+        return int(v.strip())
+    return None
+
+
+# ---------------- MENUS ----------------
+def _menu_create(form):
+    title = _clean(form.get("title"))
+    icon = _clean(form.get("icon"))
+    sort_order = int(form.get("sort_order") or 1)
+    is_active = bool(form.get("is_active"))
+
+    if not title:
+        flash("Menu title is required.", "danger")
+        return _back()
+
+    db.session.add(Menu(title=title, icon=icon or None, sort_order=sort_order, is_active=is_active))
+    db.session.commit()
+    invalidate_sidebar_cache()
+    flash("Menu created ✅", "success")
+    return _back()
+
+
+def _menu_update(form):
+    mid = int(form.get("menu_id"))
+    m = db.session.get(Menu, mid) or abort(404)
+
+    m.title = _clean(form.get("title")) or m.title
+    m.icon = _clean(form.get("icon")) or None
+    m.sort_order = int(form.get("sort_order") or m.sort_order or 1)
+    m.is_active = bool(form.get("is_active"))
+    db.session.commit()
+    invalidate_sidebar_cache()
+
+    flash("Menu updated ✅", "success")
+    return _back()
+
+
+def _menu_delete(form):
+    mid = int(form.get("menu_id"))
+    m = db.session.get(Menu, mid) or abort(404)
+    db.session.delete(m)
+    db.session.commit()
+    invalidate_sidebar_cache()
+    flash("Menu deleted ✅", "success")
+    return _back()
+
+
+# ---------------- SUBMENUS ----------------
+def _submenu_create(form):
+    menu_id = int(form.get("menu_id"))
+    title = _clean(form.get("title"))
+    endpoint = _clean(form.get("endpoint"))
+    url_ = _clean(form.get("url"))
+    icon = _clean(form.get("icon"))
+    perm = _clean(form.get("permission_code"))
+    sort_order = int(form.get("sort_order") or 1)
+    is_active = bool(form.get("is_active"))
+
+    if not title:
+        flash("SubMenu title is required.", "danger")
+        return _back()
+
+    if not endpoint and not url_:
+        flash("Provide either endpoint or url for SubMenu.", "danger")
+        return _back()
+
+    db.session.add(SubMenu(
+        menu_id=menu_id,
+        title=title,
+        endpoint=endpoint or None,
+        url=url_ or None,
+        icon=icon or None,
+        permission_code=perm or None,
+        sort_order=sort_order,
+        is_active=is_active
+    ))
+    db.session.commit()
+    invalidate_sidebar_cache()
+    flash("SubMenu created ✅", "success")
+    return _back()
+
+
+def _submenu_update(form):
+    sid = int(form.get("submenu_id"))
+    s = db.session.get(SubMenu, sid) or abort(404)
+
+    endpoint = _clean(form.get("endpoint"))
+    url_ = _clean(form.get("url"))
+
+    # validate before touching the row, so a rejected edit leaves nothing dirty in the session
+    if not endpoint and not url_:
+        flash("Provide either endpoint or url for SubMenu.", "danger")
+        return _back()
+
+    s.menu_id = int(form.get("menu_id") or s.menu_id)
+    s.title = _clean(form.get("title")) or s.title
+    s.endpoint = endpoint or None
+    s.url = url_ or None
+    s.icon = _clean(form.get("icon")) or None
+    s.permission_code = _clean(form.get("permission_code")) or None
+    s.sort_order = int(form.get("sort_order") or s.sort_order or 1)
+    s.is_active = bool(form.get("is_active"))
+
+    db.session.commit()
+    invalidate_sidebar_cache()
+    flash("SubMenu updated ✅", "success")
+    return _back()
+
+
+def _submenu_delete(form):
+    sid = int(form.get("submenu_id"))
+    s = db.session.get(SubMenu, sid) or abort(404)
+    db.session.delete(s)
+    db.session.commit()
+    invalidate_sidebar_cache()
+    flash("SubMenu deleted ✅", "success")
+    return _back()
+
+
+# POST action -> handler(form)
+_ACTIONS = {
+    "menu_create": _menu_create,
+    "menu_update": _menu_update,
+    "menu_delete": _menu_delete,
+    "submenu_create": _submenu_create,
+    "submenu_update": _submenu_update,
+    "submenu_delete": _submenu_delete,
+}
+
+
 @menu_bp.route("/menu-management", methods=["GET", "POST"])
 @login_required
 @require_perm("menus.manage")  # or create a dedicated "menus.manage"
 def menu_management():
     if request.method == "POST":
-        action = request.form.get("action")
-
-        # ---------------- MENUS ----------------
-        if action == "menu_create":
-            title = _clean(request.form.get("title"))
-            icon = _clean(request.form.get("icon"))
-            sort_order = int(request.form.get("sort_order") or 1)
-            is_active = bool(request.form.get("is_active"))
-
-            if not title:
-                flash("Menu title is required.", "danger")
-                return redirect(url_for("menu_master.menu_management"))
-
-            db.session.add(Menu(title=title, icon=icon or None, sort_order=sort_order, is_active=is_active))
-            db.session.commit()
-            flash("Menu created ✅", "success")
-            return redirect(url_for("menu_master.menu_management"))
-
-        if action == "menu_update":
-            mid = int(request.form.get("menu_id"))
-            m = Menu.query.get_or_404(mid)
-
-            m.title = _clean(request.form.get("title")) or m.title
-            m.icon = _clean(request.form.get("icon")) or None
-            m.sort_order = int(request.form.get("sort_order") or m.sort_order or 1)
-            m.is_active = bool(request.form.get("is_active"))
-            db.session.commit()
-
-            flash("Menu updated ✅", "success")
-            return redirect(url_for("menu_master.menu_management"))
-
-        if action == "menu_delete":
-            mid = int(request.form.get("menu_id"))
-            m = Menu.query.get_or_404(mid)
-            db.session.delete(m)
-            db.session.commit()
-            flash("Menu deleted ✅", "success")
-            return redirect(url_for("menu_master.menu_management"))
-
-        # ---------------- SUBMENUS ----------------
-        if action == "submenu_create":
-            menu_id = int(request.form.get("menu_id"))
-            title = _clean(request.form.get("title"))
-            endpoint = _clean(request.form.get("endpoint"))
-            url_ = _clean(request.form.get("url"))
-            icon = _clean(request.form.get("icon"))
-            perm = _clean(request.form.get("permission_code"))
-            sort_order = int(request.form.get("sort_order") or 1)
-            is_active = bool(request.form.get("is_active"))
-
-            if not title:
-                flash("SubMenu title is required.", "danger")
-                return redirect(url_for("menu_master.menu_management"))
-
-            if not endpoint and not url_:
-                flash("Provide either endpoint or url for SubMenu.", "danger")
-                return redirect(url_for("menu_master.menu_management"))
-
-            db.session.add(SubMenu(
-                menu_id=menu_id,
-                title=title,
-                endpoint=endpoint or None,
-                url=url_ or None,
-                icon=icon or None,
-                permission_code=perm or None,
-                sort_order=sort_order,
-                is_active=is_active
-            ))
-            db.session.commit()
-            flash("SubMenu created ✅", "success")
-            return redirect(url_for("menu_master.menu_management"))
-
-        if action == "submenu_update":
-            sid = int(request.form.get("submenu_id"))
-            s = SubMenu.query.get_or_404(sid)
-
-            s.menu_id = int(request.form.get("menu_id") or s.menu_id)
-            s.title = _clean(request.form.get("title")) or s.title
-            s.endpoint = _clean(request.form.get("endpoint")) or None
-            s.url = _clean(request.form.get("url")) or None
-            s.icon = _clean(request.form.get("icon")) or None
-            s.permission_code = _clean(request.form.get("permission_code")) or None
-            s.sort_order = int(request.form.get("sort_order") or s.sort_order or 1)
-            s.is_active = bool(request.form.get("is_active"))
-
-            if not s.endpoint and not s.url:
-                flash("Provide either endpoint or url for SubMenu.", "danger")
-                return redirect(url_for("menu_master.menu_management"))
-
-            db.session.commit()
-            flash("SubMenu updated ✅", "success")
-            return redirect(url_for("menu_master.menu_management"))
-
-        if action == "submenu_delete":
-            sid = int(request.form.get("submenu_id"))
-            s = SubMenu.query.get_or_404(sid)
-            db.session.delete(s)
-            db.session.commit()
-            flash("SubMenu deleted ✅", "success")
-            return redirect(url_for("menu_master.menu_management"))
+        handler = _ACTIONS.get(request.form.get("action"))
+        if handler:
+            return handler(request.form)
 
     # GET
-    menus = Menu.query.order_by(Menu.sort_order.asc(), Menu.title.asc()).all()
-    submenus = SubMenu.query.order_by(SubMenu.menu_id.asc(), SubMenu.sort_order.asc()).all()
+    menus = (Menu.query
+             .options(selectinload(Menu.submenus))
+             .order_by(Menu.sort_order.asc(), Menu.title.asc())
+             .all())
+    submenus = sorted(
+        (s for m in menus for s in m.submenus),
+        key=lambda s: (s.menu_id, s.sort_order or 0),
+    )
     perms = Permission.query.order_by(Permission.code.asc()).all()
 
-    return render_template("admin/menu_management.html", menus=menus, submenus=submenus, perms=perms)
\ No newline at end of file
+    return render_template("admin/menu_management.html", menus=menus, submenus=submenus, perms=perms)
+
+
+@menu_bp.route("/menu-management/bulk-submenus", methods=["POST"])
+@login_required
+@require_perm("menus.manage")
+def bulk_submenus():
+    """
+    JSON list of submenus -> one multi-row INSERT + one commit (the "Bulk Import" card).
+    [{"menu_id": 1, "title": "...", "endpoint": "...", "url": "...", "icon": "...",
+      "permission_code": "...", "sort_order": 1, "is_active": true}, ...]
+    Every row is validated first; a bad row rejects the whole import with a 400 naming it.
+    """
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, list) or not data:
+        return jsonify({"ok": False, "error": "Expected a non-empty JSON list"}), 400
+
+    menu_ids = {mid for (mid,) in db.session.query(Menu.id).all()}
+
+    rows = []
+    for i, r in enumerate(data):
+        if not isinstance(r, dict):
+            return jsonify({"ok": False, "error": f"Row {i}: expected an object"}), 400
+
+        menu_id = _json_int(r.get("menu_id"))
+        sort_order = r.get("sort_order")
+        sort_order = 1 if sort_order is None else _json_int(sort_order)
+        is_active = r.get("is_active")
+        is_active = True if is_active is None else is_active
+        fields = {k: r.get(k) for k in ("title", "endpoint", "url", "icon", "permission_code")}
+        if any(v is not None and not isinstance(v, str) for v in fields.values()):
+            return jsonify({"ok": False, "error": f"Row {i}: text fields must be strings"}), 400
+
+        title = _clean(fields["title"])
+        endpoint = _clean(fields["endpoint"])
+        url_ = _clean(fields["url"])
+
+        if menu_id is None or menu_id not in menu_ids:
+            return jsonify({"ok": False, "error": f"Row {i}: invalid menu_id"}), 400
+        if sort_order is None:
+            return jsonify({"ok": False, "error": f"Row {i}: sort_order must be a whole number"}), 400
+        if not isinstance(is_active, bool):
+            return jsonify({"ok": False, "error": f"Row {i}: is_active must be true or false"}), 400
+        if not title:
+            return jsonify({"ok": False, "error": f"Row {i}: title is required"}), 400
+        if not endpoint and not url_:
+            return jsonify({"ok": False, "error": f"Row {i}: provide either endpoint or url"}), 400
+
+        rows.append({
+            "menu_id": menu_id,
+            "title": title,
+            "endpoint": endpoint or None,
+            "url": url_ or None,
+            "icon": _clean(fields["icon"]) or None,
+            "permission_code": _clean(fields["permission_code"]) or None,
+            "sort_order": sort_order,
+            "is_active": is_active,
+        })
+
+    db.session.bulk_insert_mappings(SubMenu, rows)
+    db.session.commit()
+    invalidate_sidebar_cache()
+
+    flash(f"{len(rows)} SubMenu(s) imported ✅", "success")
+    return jsonify({"ok": True, "created": len(rows)})
@@ -1,17 +1,68 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from collections import namedtuple
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, g
 from flask_login import login_required
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
 from .. import db
-from ..utils import require_perm
-from ..models import Role, Permission
+from ..utils import require_perm, TTLCache, is_duplicate_key
+from ..models import Role, Permission, role_permissions
 
 rbac_bp = Blueprint("rbac", __name__, template_folder="../templates")
 
+# (tenant slug, "roles" | "perms") -> read-only name lists; writers below pop the kind they touch
+_RBAC_CACHE = TTLCache(ttl=30)
+
+RoleRow = namedtuple("RoleRow", "id name")
+PermRow = namedtuple("PermRow", "id code description")
+
 
 def _clean(s): 
     return (s or "").strip()
 
 
+def _cache_key(kind):
+    return (getattr(g, "tenant_slug", None), kind)
+
+
+def _invalidate(*kinds):
+    for kind in kinds:
+        _RBAC_CACHE.pop(_cache_key(kind), None)
+
+
+def _all_roles():
+    key = _cache_key("roles")
+    rows = _RBAC_CACHE.get(key)
+    if rows is None:
+        q = db.session.query(Role.id, Role.name).order_by(Role.name.asc())
+        rows = _RBAC_CACHE.set(key, tuple(RoleRow(*r) for r in q))
+    return rows
+
+
+def _all_perms():
+    key = _cache_key("perms")
+    rows = _RBAC_CACHE.get(key)
+    if rows is None:
+        q = (db.session.query(Permission.id, Permission.code, Permission.description)
+             .order_by(Permission.code.asc()))
+        rows = _RBAC_CACHE.set(key, tuple(PermRow(*r) for r in q))
+    return rows
+
+
+def _role_perm_ids():
+    """
+    role_id -> frozenset(permission_id), read straight off the association table.
+    Never cached: the edit form's checkboxes are posted back as the full new set,
+    so a stale copy from another worker would silently revert a change.
+    """
+    acc = {}
+    rows = db.session.execute(select(role_permissions.c.role_id, role_permissions.c.permission_id))
+    for rid, pid in rows:
+        acc.setdefault(rid, set()).add(pid)
+    return {rid: frozenset(ids) for rid, ids in acc.items()}
+
+
 @rbac_bp.route("/roles", methods=["GET", "POST"])
 @login_required
 @require_perm("roles.manage")
@@ -26,43 +77,62 @@ def roles_master():
                 flash("Role name is required.", "danger")
                 return redirect(url_for("rbac.roles_master"))
 
-            if Role.query.filter_by(name=name).first():
+            # roles.name is UNIQUE: let the DB reject duplicates
+            db.session.add(Role(name=name))
+            try:
+                db.session.commit()
+            except IntegrityError as e:
+                db.session.rollback()
+                if not is_duplicate_key(e):
+                    raise
                 flash("Role already exists.", "danger")
                 return redirect(url_for("rbac.roles_master"))
-
-            db.session.add(Role(name=name))
-            db.session.commit()
+            _invalidate("roles")
             flash("Role created ✅", "success")
             return redirect(url_for("rbac.roles_master"))
 
         # -------- Update Role --------
         if action == "update":
             rid = int(request.form.get("role_id"))
-            r = Role.query.get_or_404(rid)
+            r = db.session.get(Role, rid) or abort(404)
 
             name = _clean(request.form.get("name"))
             if not name:
                 flash("Role name is required.", "danger")
                 return redirect(url_for("rbac.roles_master"))
 
-            if name != r.name and Role.query.filter_by(name=name).first():
+            r.name = name
+            try:
+                db.session.commit()
+            except IntegrityError as e:
+                db.session.rollback()
+                if not is_duplicate_key(e):
+                    raise
                 flash("Role name already exists.", "danger")
                 return redirect(url_for("rbac.roles_master"))
-
-            r.name = name
-            db.session.commit()
+            _invalidate("roles")
             flash("Role updated ✅", "success")
             return redirect(url_for("rbac.roles_master"))
 
         # -------- Update Role Permissions --------
         if action == "set_permissions":
             rid = int(request.form.get("role_id"))
-            r = Role.query.get_or_404(rid)
-
-            perm_ids = request.form.getlist("perm_id")
-            ids = [int(x) for x in perm_ids if str(x).isdigit()]
-
-            r.permissions = Permission.query.filter(Permission.id.in_(ids)).all() if ids else []
+            db.session.get(Role, rid) or abort(404)
+
+            # keep only ids that exist (one primary-key lookup), then rewrite the association rows directly
+            perm_ids = {int(x) for x in request.form.getlist("perm_id") if str(x).isdigit()}
+            ids = []
+            if perm_ids:
+                ids = sorted(db.session.execute(
+                    select(Permission.id).where(Permission.id.in_(perm_ids))
+                ).scalars())
+
+            db.session.execute(role_permissions.delete().where(role_permissions.c.role_id == rid))
+            if ids:
+                db.session.execute(
+                    role_permissions.insert(),
+                    [{"role_id": rid, "permission_id": pid} for pid in ids],
+                )
             db.session.commit()
 
             flash("Role permissions updated ✅", "success")
@@ -70,15 +140,18 @@ def roles_master():
 
     # GET
     q = _clean(request.args.get("q"))
-    roles_qs = Role.query
+    roles = _all_roles()
     if q:
-        like = f"%{q}%"
-        roles_qs = roles_qs.filter(Role.name.like(like))
+        needle = q.lower()
+        roles = [r for r in roles if needle in r.name.lower()]
 
-    roles = roles_qs.order_by(Role.name.asc()).all()
-    perms = Permission.query.order_by(Permission.code.asc()).all()
-
-    return render_template("admin/roles_master.html", roles=roles, perms=perms, q=q)
+    return render_template(
+        "admin/roles_master.html",
+        roles=roles,
+        perms=_all_perms(),
+        role_perms=_role_perm_ids(),
+        q=q,
+    )
 
 
 @rbac_bp.route("/permissions", methods=["GET", "POST"])
@@ -97,32 +170,38 @@ def permissions_master():
                 flash("Permission code is required.", "danger")
                 return redirect(url_for("rbac.permissions_master"))
 
-            if Permission.query.filter_by(code=code).first():
+            # permissions.code is UNIQUE: let the DB reject duplicates
+            db.session.add(Permission(code=code, description=desc or None))
+            try:
+                db.session.commit()
+            except IntegrityError as e:
+                db.session.rollback()
+                if not is_duplicate_key(e):
+                    raise
                 flash("Permission already exists.", "danger")
                 return redirect(url_for("rbac.permissions_master"))
-
-            db.session.add(Permission(code=code, description=desc or None))
-            db.session.commit()
+            _invalidate("perms")
             flash("Permission created ✅", "success")
             return redirect(url_for("rbac.permissions_master"))
 
         # -------- Update Permission --------
         if action == "update":
             pid = int(request.form.get("permission_id"))
-            p = Permission.query.get_or_404(pid)
+            p = db.session.get(Permission, pid) or abort(404)
 
             # We typically lock 'code' (used everywhere), allow description edits
             p.description = _clean(request.form.get("description")) or None
             db.session.commit()
+            _invalidate("perms")
 
             flash("Permission updated ✅", "success")
             return redirect(url_for("rbac.permissions_master"))
 
     q = _clean(request.args.get("q"))
-    qs = Permission.query
+    perms = _all_perms()
     if q:
-        like = f"%{q}%"
-        qs = qs.filter((Permission.code.like(like)) | (Permission.description.like(like)))
+        needle = q.lower()
+        perms = [p for p in perms
+                 if needle in p.code.lower() or needle in (p.description or "").lower()]
 
-    perms = qs.order_by(Permission.code.asc()).all()
     return render_template("admin/permissions_master.html", perms=perms, q=q)
\ No newline at end of file
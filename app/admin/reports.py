@@ -1,12 +1,31 @@
+import heapq
+import json
+import os
+from bisect import bisect_left
+import re
+import threading
+import time as _time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, time, timedelta, datetime
 from calendar import monthrange
+from collections import Counter, namedtuple
 from decimal import Decimal
-from sqlalchemy import or_, and_, func
-from flask import Blueprint, render_template, request, make_response
-from flask_login import login_required
+from functools import lru_cache
+from sqlalchemy import or_, and_, func, literal_column, case, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from flask import (
+    Blueprint, render_template, request, make_response, g,
+    current_app, redirect, url_for, send_file, abort,
+)
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload, selectinload, contains_eager
 
 from .. import db
-from ..utils import require_perm
+from ..utils import require_perm, TTLCache
+from ..services.margin import get_margin_threshold_percent
+from ..services.team import reporting_tree_user_ids
 from ..models import (
     User, EmployeeProfile,
     Lead, LeadSource,
@@ -14,27 +33,65 @@ from ..models import (
     Quote, QuoteStatus,
     Invoice,
     Project, Client,
-    MarginSettings,
     Cluster,InvoicePayment,
 )
 
 reports_bp = Blueprint("reports", __name__, template_folder="../templates")
 
+_ZERO = Decimal("0")
+_AMBER_RATIO = Decimal("0.80")  # productivity: >= 80% of required run-rate is Amber
+
+# WeasyPrint takes seconds on long reports: render off the request thread.
+# Job files live in REPORT_PDF_DIR so any worker process can serve the result.
+_PDF_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-pdf")
+_PDF_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_PDF_JOB_TTL = 3600  # seconds
+_PDF_JOB_TIMEOUT = 300  # a render still running this long after it started is treated as failed
+_PDF_QUEUE_TIMEOUT = 900  # a job no executor has started this long after submission is lost (worker restarted)
+_PDF_PART_STALE = 60  # a .part untouched this long belongs to a render that died mid-write
+_PDF_THREAD_STATE = threading.local()
+# base.html links version-pinned Bootstrap CSS / icon fonts from the CDN; fetched once per process
+_PDF_CACHEABLE_URL_PREFIXES = ("https://cdn.jsdelivr.net/npm/",)
+_PDF_ASSET_CACHE = {}
+_PDF_ROW_CAP = 5000  # hard ceiling on detail rows in a PDF export
+_PAGE_SIZE = 50
+
+# Report table rows (templates read them by attribute, e.g. r.remaining)
+ProductivityRow = namedtuple(
+    "ProductivityRow",
+    "user role monthly_ctc revenue_mtd productivity required_mult required_mtd run_rate_gap status",
+)
+AgingRow = namedtuple("AgingRow", "invoice due_date days_outstanding remaining bucket responsible")
+MarginRow = namedtuple(
+    "MarginRow",
+    "project contract_value total_cost margin_percent margin_amount is_flag responsible",
+)
+
+# tenant slug -> active clusters for the report dropdowns (cleared by cluster_master writes)
+ClusterOption = namedtuple("ClusterOption", "id name head_name")
+_CLUSTER_OPTIONS_CACHE = TTLCache(ttl=60)
+_QUALIFIED_STAGE_CACHE = TTLCache(ttl=60)
+
 
 # -------------------------
 # Helpers
 # -------------------------
+_MONTH_RE = re.compile(r"^(\d{4})-(0?[1-9]|1[0-2])$")
+
+
+@lru_cache(maxsize=64)
+def _parse_month_str(s: str):
+    """"YYYY-MM" -> (year, month), or None if it isn't one."""
+    m = _MONTH_RE.match(s)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
 def _parse_month(s: str):
     """Accepts YYYY-MM. Defaults to current month. Returns (year, month)."""
-    if s:
-        s = s.strip()
-        try:
-            y, m = s.split("-")
-            y = int(y); m = int(m)
-            if 1 <= m <= 12:
-                return y, m
-        except Exception:
-            pass
+    ym = _parse_month_str(s.strip()) if s else None
+    if ym:
+        return ym
+    # not cached: "today" moves
     today = date.today()
     return today.year, today.month
 
@@ -48,56 +105,208 @@ def _month_bounds(y: int, m: int):
 def _cluster_user_ids(head_user_id: int):
     """
     Cluster = head + all reporting tree under him (EmployeeProfile.reporting_manager_user_id).
+    One employee_closure lookup, memoized on g for the current request only
+    (reporting_tree_user_ids), so a reporting change is visible to every worker at once.
     """
-    seen = set([head_user_id])
-    queue = [head_user_id]
-
-    while queue:
-        mid = queue.pop(0)
-        rows = (
-            db.session.query(EmployeeProfile.user_id)
-            .filter(EmployeeProfile.reporting_manager_user_id == mid)
-            .all()
-        )
-        for (uid,) in rows:
-            if uid not in seen:
-                seen.add(uid)
-                queue.append(uid)
+    return reporting_tree_user_ids(head_user_id)
+
+
+def _invoice_paid_subquery():
+    """invoice_id -> collected amount (non-rejected payments), as Invoice.collected_amount()."""
+    return (db.session.query(
+                InvoicePayment.invoice_id.label("invoice_id"),
+                func.sum(InvoicePayment.amount).label("paid"),
+            )
+            .filter(InvoicePayment.status != "Rejected")
+            .group_by(InvoicePayment.invoice_id)
+            .subquery())
+
+
+class _days_between(FunctionElement):
+    """_days_between(later, earlier) -> whole days as INTEGER, compiled per dialect."""
+    type = Integer()
+    name = "days_between"
+    inherit_cache = True
+
+
+@compiles(_days_between)
+def _days_between_mysql(element, compiler, **kw):
+    later, earlier = element.clauses
+    return "DATEDIFF(%s, %s)" % (compiler.process(later, **kw), compiler.process(earlier, **kw))
+
+
+@compiles(_days_between, "postgresql")
+def _days_between_pg(element, compiler, **kw):
+    later, earlier = element.clauses
+    return "(CAST(%s AS DATE) - CAST(%s AS DATE))" % (
+        compiler.process(later, **kw), compiler.process(earlier, **kw))
+
 
-    return list(seen)
+@compiles(_days_between, "sqlite")
+def _days_between_sqlite(element, compiler, **kw):
+    later, earlier = element.clauses
+    # date() drops any time part, matching DATEDIFF / the DATE casts above
+    return "CAST(julianday(date(%s)) - julianday(date(%s)) AS INTEGER)" % (
+        compiler.process(later, **kw), compiler.process(earlier, **kw))
 
 
 def _margin_threshold():
-    ms = (MarginSettings.query
-          .filter(MarginSettings.is_active == True)
-          .order_by(MarginSettings.id.desc())
-          .first())
-    return Decimal(str(ms.threshold_percent)) if ms else Decimal("50.00")
+    # per-tenant cached singleton (see app/services/margin.py), 0 queries on the hot path
+    return get_margin_threshold_percent()
+
+
+def _font_config():
+    """
+    One WeasyPrint FontConfiguration per PDF worker thread, reused across jobs
+    (font discovery is the expensive part of small renders; not shared across threads).
+    """
+    fc = getattr(_PDF_THREAD_STATE, "font_config", None)
+    if fc is None:
+        try:
+            # WeasyPrint >= 53
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:
+            # WeasyPrint < 53
+            from weasyprint.fonts import FontConfiguration
+        fc = _PDF_THREAD_STATE.font_config = FontConfiguration()
+    return fc
+
+
+def _pdf_url_fetcher(url, *args, **kwargs):
+    """
+    WeasyPrint url_fetcher that keeps pinned CDN assets in memory, so repeat renders
+    skip the download (Bootstrap alone is ~230 KB per PDF otherwise).
+    App URLs (tenant logos etc.) always go through the default fetcher.
+    """
+    from weasyprint import default_url_fetcher
+
+    if not url.startswith(_PDF_CACHEABLE_URL_PREFIXES):
+        return default_url_fetcher(url, *args, **kwargs)
+
+    hit = _PDF_ASSET_CACHE.get(url)
+    if hit is None:
+        result = default_url_fetcher(url, *args, **kwargs)
+        file_obj = result.pop("file_obj", None)
+        if file_obj is not None:
+            try:
+                result["string"] = file_obj.read()
+            finally:
+                file_obj.close()
+        hit = _PDF_ASSET_CACHE[url] = result
+    return dict(hit)
+
+
+def _write_pdf_job(html: str, base_url: str, job_base: str):
+    """
+    Runs on _PDF_EXECUTOR: <job>.pdf on success, <job>.html (original fallback) on failure.
+    <job>.run marks the render start for _pdf_job_failed; a job dropped meanwhile
+    (timed out by pdf_job) is skipped, or its late result removed.
+    """
+    if not os.path.exists(job_base + ".job"):
+        return
+    open(job_base + ".run", "w").close()
+    try:
+        from weasyprint import HTML
+        HTML(string=html, base_url=base_url, url_fetcher=_pdf_url_fetcher).write_pdf(
+            target=job_base + ".part", font_config=_font_config()
+        )
+        os.replace(job_base + ".part", job_base + ".pdf")
+    except Exception:
+        _remove_quietly(job_base + ".part")
+        with open(job_base + ".html", "w", encoding="utf-8") as f:
+            f.write(html)
+    finally:
+        _remove_quietly(job_base + ".run")
+        if not os.path.exists(job_base + ".job"):
+            _drop_pdf_job(job_base)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _purge_old_pdf_jobs(pdf_dir: str):
+    cutoff = _time.time() - _PDF_JOB_TTL
+    for entry in os.scandir(pdf_dir):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _drop_pdf_job(job_base: str):
+    for ext in (".pdf", ".html", ".part", ".run", ".job"):
+        _remove_quietly(job_base + ext)
+
+
+def _pdf_job_failed(job_base: str, submitted_at: float) -> bool:
+    """No result yet and the render can no longer produce one (worker killed/restarted, hung)."""
+    now = _time.time()
+    try:
+        running_since = os.stat(job_base + ".run").st_mtime
+    except OSError:
+        # still queued behind other renders, or the worker holding the queue is gone
+        return now - submitted_at > _PDF_QUEUE_TIMEOUT
+    if now - running_since > _PDF_JOB_TIMEOUT:
+        return True
+    try:
+        return now - os.stat(job_base + ".part").st_mtime > _PDF_PART_STALE
+    except OSError:
+        return False
 
 
 def _render_pdf(html: str, filename: str):
     """
     WeasyPrint PDF render (fallback to HTML if not installed/failed).
+    Rendering runs in a background thread; the browser is sent to reports.pdf_job,
+    which polls until the file is ready and then downloads it.
     """
     try:
-        from weasyprint import HTML
-        pdf = HTML(string=html, base_url=request.url_root).write_pdf()
-        resp = make_response(pdf)
-        resp.headers["Content-Type"] = "application/pdf"
-        resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
-        return resp
+        import weasyprint  # noqa: F401
     except Exception:
         resp = make_response(html)
         resp.headers["Content-Type"] = "text/html"
         return resp
 
+    pdf_dir = current_app.config["REPORT_PDF_DIR"]
+    os.makedirs(pdf_dir, exist_ok=True)
+    _purge_old_pdf_jobs(pdf_dir)
+
+    job_id = uuid.uuid4().hex
+    job_base = os.path.join(pdf_dir, job_id)
+    # who may fetch the result: REPORT_PDF_DIR is shared by every tenant
+    with open(job_base + ".job", "w", encoding="utf-8") as f:
+        json.dump({
+            "filename": filename,
+            "user_id": current_user.id,
+            "tenant": getattr(g, "tenant_slug", None),
+            "submitted_at": _time.time(),
+        }, f)
+
+    _PDF_EXECUTOR.submit(_write_pdf_job, html, request.url_root, job_base)
+    return redirect(url_for("reports.pdf_job", job_id=job_id))
+
 
 def _clusters():
     """Dropdown list"""
-    return (Cluster.query
-            .filter(Cluster.is_active == True)
-            .order_by(Cluster.name.asc())
-            .all())
+    slug = getattr(g, "tenant_slug", None)
+    opts = _CLUSTER_OPTIONS_CACHE.get(slug)
+    if opts is None:
+        rows = (db.session.query(Cluster.id, Cluster.name, User.name)
+                .outerjoin(User, Cluster.head_user_id == User.id)
+                .filter(Cluster.is_active == True)
+                .order_by(Cluster.name.asc()))
+        opts = _CLUSTER_OPTIONS_CACHE.set(slug, tuple(ClusterOption(*r) for r in rows))
+    return opts
+
+
+def invalidate_cluster_options():
+    """Call after any Cluster create/update/disable."""
+    _CLUSTER_OPTIONS_CACHE.clear()
 
 
 def _cluster_filter_params():
@@ -120,11 +329,16 @@ def _cluster_filter_params():
 def _role(u: User):
     tr = ""
     try:
-        tr = (u.profile.team_role or "").strip()
+        tr = u.profile.team_role
     except Exception:
         tr = ""
+    return _team_role_code(tr)
+
 
-    tr_u = tr.upper().replace("_", " ").replace("-", " ").strip()
+@lru_cache(maxsize=256)
+def _team_role_code(team_role):
+    """EmployeeProfile.team_role (free text) -> "AM" / "BD" / "" (few distinct values, so memoized)"""
+    tr_u = (team_role or "").strip().upper().replace("_", " ").replace("-", " ").strip()
 
     if tr_u in ("AM", "ACCOUNT MANAGER", "ACCOUNT MANAGEMENT"):
         return "AM"
@@ -135,20 +349,97 @@ def _role(u: User):
     return ""
 
 
+def _bd_role_filter():
+    """SQL twin of _team_role_code(...) == "BD" on EmployeeProfile.team_role."""
+    tr = func.replace(func.replace(EmployeeProfile.team_role, "_", " "), "-", " ")
+    return func.upper(func.trim(tr)).in_(("BD", "BUSINESS DEVELOPMENT", "SALES"))
+
+
+# days since last invoice: <= 60 Active, 61-90 Dormant Risk, > 90 Inactive
+_HEALTH_GAP_EDGES = (60, 90)
+_HEALTH_STATUSES = ("Active", "Dormant Risk", "Inactive")
+
+
+def _health_status(last_inv, ref_date):
+    """Account health bucket for a client's last invoice date (None -> Inactive)."""
+    if last_inv is None:
+        return "Inactive"
+    return _HEALTH_STATUSES[bisect_left(_HEALTH_GAP_EDGES, (ref_date - last_inv).days)]
+
+
+def _qualified_stage_ids():
+    """
+    ids of "qualified" stages: probability >= 50 or name mentions QUAL/PROPOS/NEGOT/WON.
+    pipeline_stages is a handful of rows, so the name match runs once per tenant (cached)
+    instead of per opportunity row.
+    """
+    slug = getattr(g, "tenant_slug", None)
+    ids = _QUALIFIED_STAGE_CACHE.get(slug)
+    if ids is None:
+        stage_name = func.upper(PipelineStage.name)
+        rows = (db.session.query(PipelineStage.id)
+                .filter(or_(
+                    PipelineStage.probability >= 50,
+                    stage_name.like("%QUAL%"),
+                    stage_name.like("%PROPOS%"),
+                    stage_name.like("%NEGOT%"),
+                    stage_name.like("%WON%"),
+                )))
+        ids = _QUALIFIED_STAGE_CACHE.set(slug, tuple(sid for (sid,) in rows))
+    return ids
+
+
 def _qualified_stage_filter():
-    return or_(
-        PipelineStage.probability >= 50,
-        func.upper(PipelineStage.name).like("%QUAL%"),
-        func.upper(PipelineStage.name).like("%PROPOS%"),
-        func.upper(PipelineStage.name).like("%NEGOT%"),
-        func.upper(PipelineStage.name).like("%WON%"),
-    )
+    # plain IN on opportunities.stage_id, no per-row UPPER()/LIKE over the joined stage
+    return Opportunity.stage_id.in_(_qualified_stage_ids())
+
 
 def _safe_dec(v):
+    # Numeric columns already come back as Decimal: skip the str() round trip
+    if isinstance(v, Decimal):
+        return v
+    if not v:
+        return _ZERO
+    # ints (COALESCE(..., 0) / integer sums) convert exactly without going through str
+    if isinstance(v, int):
+        return Decimal(v)
     try:
-        return Decimal(str(v or 0))
+        return Decimal(str(v))
     except Exception:
-        return Decimal("0")
+        return _ZERO
+
+
+@reports_bp.route("/reports/pdf/<job_id>", methods=["GET"])
+@login_required
+def pdf_job(job_id):
+    if not _PDF_JOB_ID_RE.match(job_id):
+        abort(404)
+
+    job_base = os.path.join(current_app.config["REPORT_PDF_DIR"], job_id)
+    try:
+        with open(job_base + ".job", encoding="utf-8") as f:
+            job = json.load(f)
+    except (OSError, ValueError):
+        abort(404)
+
+    # only the requesting user, in the tenant the report was built in
+    if job.get("user_id") != current_user.id or job.get("tenant") != getattr(g, "tenant_slug", None):
+        abort(404)
+
+    # served straight from disk (send_file streams it in chunks); the files stay until
+    # _purge_old_pdf_jobs drops them after the TTL, so a retried download still works
+    if os.path.exists(job_base + ".pdf"):
+        return send_file(job_base + ".pdf", mimetype="application/pdf",
+                         as_attachment=True, download_name=job["filename"])
+
+    if os.path.exists(job_base + ".html"):
+        return send_file(job_base + ".html", mimetype="text/html")
+
+    if _pdf_job_failed(job_base, job.get("submitted_at") or 0):
+        _drop_pdf_job(job_base)
+        return render_template("reports/pdf_failed.html"), 500
+
+    return render_template("reports/pdf_pending.html"), 202
 
 
 # -------------------------
@@ -171,18 +462,12 @@ def cluster_productivity():
 
     cluster_id, cluster, allowed_ids = _cluster_filter_params()
 
-    u_qs = (User.query
-            .outerjoin(EmployeeProfile, EmployeeProfile.user_id == User.id)
-            .filter(User.is_active == True))
-    if allowed_ids:
-        u_qs = u_qs.filter(User.id.in_(allowed_ids))
-    users = u_qs.order_by(User.name.asc()).all()
-
     # Revenue MTD per owner (Opportunity.owner_id)
     rev_qs = (db.session.query(
                 Opportunity.owner_id.label("owner_id"),
                 db.func.coalesce(db.func.sum(Invoice.total_amount), 0).label("revenue_mtd")
             )
+            .select_from(Invoice)
             .join(Quote, Quote.id == Invoice.quote_id)
             .join(Opportunity, Opportunity.id == Quote.opportunity_id)
             .filter(Invoice.invoice_date >= start_date, Invoice.invoice_date <= end_date)
@@ -191,59 +476,84 @@ def cluster_productivity():
     if allowed_ids:
         rev_qs = rev_qs.filter(Opportunity.owner_id.in_(allowed_ids))
 
-    rows = rev_qs.group_by(Opportunity.owner_id).all()
-    revenue_map = {r.owner_id: _safe_dec(r.revenue_mtd) for r in rows}
+    rev_sq = rev_qs.group_by(Opportunity.owner_id).subquery()
+
+    # RAG status in SQL, cross-multiplied so no division is needed:
+    # rev >= ctc * mult * days_elapsed / days_in_month  <=>  rev * days_in_month >= ctc * mult * days_elapsed
+    revenue = db.func.coalesce(rev_sq.c.revenue_mtd, 0)
+    ctc = db.func.coalesce(User.monthly_ctc, 0)
+    need = ctc * case((_bd_role_filter(), 15 * days_elapsed), else_=25 * days_elapsed)
+    have = revenue * days_in_month
+    rag = case(
+        (need <= 0, case((revenue > 0, "Amber"), else_="Red")),
+        (have >= need, "Green"),
+        (have >= need * _AMBER_RATIO, "Amber"),
+        else_="Red",
+    )
+
+    # users + team role + revenue + status in one result set (plain tuples, no ORM hydration)
+    u_qs = (db.session.query(
+                User.id, User.name, User.email, User.monthly_ctc,
+                EmployeeProfile.team_role,
+                revenue.label("revenue_mtd"),
+                rag.label("status"),
+            )
+            .outerjoin(EmployeeProfile, EmployeeProfile.user_id == User.id)
+            .outerjoin(rev_sq, rev_sq.c.owner_id == User.id)
+            .filter(User.is_active == True))
+    if allowed_ids:
+        u_qs = u_qs.filter(User.id.in_(allowed_ids))
+    users = u_qs.order_by(User.name.asc()).all()
 
     data = []
     total_revenue = Decimal("0")
     total_ctc = Decimal("0")
-    red_count = amber_count = green_count = 0
+    status_counts = Counter()
+
+    # loop invariants: required_mtd = ctc * (mult * days_elapsed) / days_in_month
+    # mult * days_elapsed is an exact integer product, so it is folded once per role
+    # (same Decimal result as multiplying per row, one fewer multiply per user)
+    elapsed = Decimal(days_elapsed)
+    in_month = Decimal(days_in_month)
+    bd_mult, default_mult = Decimal("15"), Decimal("25")
+    bd_scale, default_scale = bd_mult * elapsed, default_mult * elapsed
 
     for u in users:
         monthly_ctc = _safe_dec(u.monthly_ctc)
-        role = _role(u)
-
-        required_mult = Decimal("15") if role == "BD" else Decimal("25")
-        required_month_revenue = monthly_ctc * required_mult
+        role = _team_role_code(u.team_role)
+        if role == "BD":
+            required_mult, scale = bd_mult, bd_scale
+        else:
+            required_mult, scale = default_mult, default_scale
 
-        rev = revenue_map.get(u.id, Decimal("0"))
+        rev = _safe_dec(u.revenue_mtd)
         total_revenue += rev
         total_ctc += monthly_ctc
 
-        productivity = (rev / monthly_ctc) if monthly_ctc > 0 else Decimal("0")
+        productivity = (rev / monthly_ctc) if monthly_ctc > 0 else _ZERO
 
-        required_mtd = (required_month_revenue * Decimal(days_elapsed) / Decimal(days_in_month)) if days_in_month else Decimal("0")
+        # days_in_month is never 0 (clamped month bounds), so no guard on the divide
+        required_mtd = monthly_ctc * scale / in_month
         run_rate_gap = rev - required_mtd
 
-        status = "Red"
-        if required_mtd <= 0:
-            status = "Amber" if rev > 0 else "Red"
-        else:
-            if rev >= required_mtd:
-                status = "Green"
-            elif rev >= (required_mtd * Decimal("0.80")):
-                status = "Amber"
-            else:
-                status = "Red"
-
-        if status == "Green":
-            green_count += 1
-        elif status == "Amber":
-            amber_count += 1
-        else:
-            red_count += 1
-
-        data.append({
-            "user": u,
-            "role": role,
-            "monthly_ctc": monthly_ctc,
-            "revenue_mtd": rev,
-            "productivity": productivity,
-            "required_mult": required_mult,
-            "required_mtd": required_mtd,
-            "run_rate_gap": run_rate_gap,
-            "status": status,
-        })
+        status = u.status
+        status_counts[status] += 1
+
+        data.append(ProductivityRow(
+            user=u,
+            role=role,
+            monthly_ctc=monthly_ctc,
+            revenue_mtd=rev,
+            productivity=productivity,
+            required_mult=required_mult,
+            required_mtd=required_mtd,
+            run_rate_gap=run_rate_gap,
+            status=status,
+        ))
+
+    green_count = status_counts["Green"]
+    amber_count = status_counts["Amber"]
+    red_count = status_counts["Red"]
 
     avg_productivity = (total_revenue / total_ctc) if total_ctc > 0 else Decimal("0")
 
@@ -287,68 +597,81 @@ def cluster_collections_aging():
 
     cluster_id, cluster, allowed_ids = _cluster_filter_params()
 
-    qs = (Invoice.query
-          .join(Quote, Invoice.quote_id == Quote.id)
-          .join(Opportunity, Quote.opportunity_id == Opportunity.id)
-          .filter(Invoice.invoice_date >= start_date, Invoice.invoice_date <= end_date)
-          .filter(Invoice.status != "Cancelled"))
-
-    # Cluster scope: only invoices where opp owner is in cluster
-    if allowed_ids:
-        qs = qs.filter(Opportunity.owner_id.in_(allowed_ids))
-
-    invoices = qs.order_by(Invoice.id.desc()).all()
-
-    buckets = {"0-30": [], "31-60": [], "61-90": [], "90+": []}
+    page = request.args.get("page", 1, type=int)
+    is_pdf = (request.args.get("format") or "").lower() == "pdf"
+
+    # remaining = total - non-rejected payments (same rule as Invoice.remaining_amount())
+    paid_sq = _invoice_paid_subquery()
+    remaining = (func.coalesce(Invoice.total_amount, 0) - func.coalesce(paid_sq.c.paid, 0)).label("remaining")
+    due = func.coalesce(Invoice.due_date, Invoice.invoice_date).label("due_date")
+    days = _days_between(today, func.coalesce(Invoice.due_date, Invoice.invoice_date)).label("days_outstanding")
+
+    # days_outstanding <= 30 / 60 / 90  <=>  due >= today - 30 / 60 / 90
+    bucket = case(
+        (due >= today - timedelta(days=30), "0-30"),
+        (due >= today - timedelta(days=60), "31-60"),
+        (due >= today - timedelta(days=90), "61-90"),
+        else_="90+",
+    ).label("bucket")
+
+    def _scoped(q):
+        q = (q.join(Quote, Invoice.quote_id == Quote.id)
+              .join(Opportunity, Quote.opportunity_id == Opportunity.id)
+              .outerjoin(paid_sq, paid_sq.c.invoice_id == Invoice.id)
+              .filter(Invoice.invoice_date >= start_date, Invoice.invoice_date <= end_date)
+              .filter(Invoice.status != "Cancelled")
+              .filter(remaining > 0))
+        # Cluster scope: only invoices where opp owner is in cluster
+        if allowed_ids:
+            q = q.filter(Opportunity.owner_id.in_(allowed_ids))
+        return q
+
+    # Tiles: one GROUP BY over the bucket expression
+    buckets = {"0-30": 0, "31-60": 0, "61-90": 0, "90+": 0}
     total_outstanding = Decimal("0")
     exposure_60 = Decimal("0")
 
-    user_cache = {}
-
-    def _user_name(uid):
-        if not uid:
-            return "—"
-        if uid not in user_cache:
-            user_cache[uid] = User.query.get(uid)
-        return user_cache[uid].name if user_cache[uid] else "—"
-
-    rows = []
-    for inv in invoices:
-        remaining = _safe_dec(inv.remaining_amount() or 0)
-        if remaining <= 0:
-            continue
-
-        due = inv.due_date or inv.invoice_date
-        days_outstanding = (today - due).days
-
-        total_outstanding += remaining
-        if days_outstanding > 60:
-            exposure_60 += remaining
-
-        if days_outstanding <= 30:
-            bucket = "0-30"
-        elif days_outstanding <= 60:
-            bucket = "31-60"
-        elif days_outstanding <= 90:
-            bucket = "61-90"
-        else:
-            bucket = "90+"
+    summary = (_scoped(db.session.query(bucket, func.count(Invoice.id), func.sum(remaining)).select_from(Invoice))
+               .group_by(literal_column("bucket"))
+               .all())
+    for b, cnt, amt in summary:
+        amt = _safe_dec(amt)
+        buckets[b] = int(cnt or 0)
+        total_outstanding += amt
+        if b in ("61-90", "90+"):
+            exposure_60 += amt
+
+    # Detail rows: quote/opportunity come from the scope joins, owner + client joined on
+    rows_q = _scoped(
+        Invoice.query
+        .options(
+            contains_eager(Invoice.quote).contains_eager(Quote.opportunity).joinedload(Opportunity.owner),
+            joinedload(Invoice.client),
+        )
+        .add_columns(remaining, due, days, bucket)
+    )
 
-        opp_owner_id = inv.quote.opportunity.owner_id if inv.quote and inv.quote.opportunity else None
-        owner_name = _user_name(opp_owner_id)
+    def _row(inv, rem, due_date, days_out, b):
+        opp = inv.quote.opportunity if inv.quote else None
+        return AgingRow(
+            invoice=inv,
+            due_date=due_date,
+            days_outstanding=int(days_out or 0),
+            remaining=_safe_dec(rem),
+            bucket=b,
+            responsible=opp.owner.name if opp and opp.owner else "—",
+        )
 
-        row = {
-            "invoice": inv,
-            "due_date": due,
-            "days_outstanding": days_outstanding,
-            "remaining": remaining,
-            "bucket": bucket,
-            "responsible": owner_name,
-        }
-        rows.append(row)
-        buckets[bucket].append(row)
+    top_overdue = [_row(*r) for r in rows_q.order_by(days.desc(), Invoice.id.desc()).limit(10).all()]
 
-    top_overdue = sorted(rows, key=lambda r: r["days_outstanding"], reverse=True)[:10]
+    # PDF exports everything (capped); the HTML table is paged
+    pagination = None
+    if is_pdf:
+        # every relationship _row() reads is joined in, so batches stream without lazy loads
+        rows = [_row(*r) for r in rows_q.order_by(Invoice.id.desc()).limit(_PDF_ROW_CAP).yield_per(500)]
+    else:
+        pagination = rows_q.order_by(Invoice.id.desc()).paginate(page=page, per_page=_PAGE_SIZE, error_out=False)
+        rows = [_row(*r) for r in pagination.items]
 
     clusters = _clusters()
     tpl = "reports/cluster_collections_aging.html"
@@ -361,12 +684,13 @@ def cluster_collections_aging():
         buckets=buckets,
         top_overdue=top_overdue,
         rows=rows,
+        pagination=pagination,
         clusters=clusters,
         cluster_id=cluster_id,
         cluster=cluster,
     )
 
-    if (request.args.get("format") or "").lower() == "pdf":
+    if is_pdf:
         html = render_template(tpl, **ctx)
         return _render_pdf(html, f"cluster_collections_aging_{y:04d}-{m:02d}.pdf")
 
@@ -391,81 +715,109 @@ def cluster_margin_quality():
     cluster_id, cluster, allowed_ids = _cluster_filter_params()
     threshold = _margin_threshold()
 
-    qs = (Project.query
-          .join(Quote, Project.quote_id == Quote.id)
-          .join(Opportunity, Quote.opportunity_id == Opportunity.id)
-          .outerjoin(Client, Project.client_id == Client.id))
+    page = request.args.get("page", 1, type=int)
+    is_pdf = (request.args.get("format") or "").lower() == "pdf"
 
-    
     dt_from = datetime.combine(start_date, time.min)
     dt_to   = datetime.combine(end_date, time.max)
 
-    qs = qs.filter(Project.created_at >= dt_from, Project.created_at <= dt_to)
-
-    if client_id.isdigit():
-        qs = qs.filter(Project.client_id == int(client_id))
-
-    if flag_only == "1":
-        qs = qs.filter(Project.margin_percent < threshold)
-
-    if responsible.isdigit():
-        qs = qs.filter(Project.account_manager_user_id == int(responsible))
-
-    # Cluster scope rule:
-    # If AM is set -> belongs to that AM
-    # Else -> belongs to opp owner (BD)
-    if allowed_ids:
-        qs = qs.filter(
-            or_(
-                Project.account_manager_user_id.in_(allowed_ids),
-                and_(
-                    Project.account_manager_user_id.is_(None),
-                    Opportunity.owner_id.in_(allowed_ids)
+    # margin_percent NULL counts as 0%, same as _safe_dec() on the row
+    is_flag_expr = func.coalesce(Project.margin_percent, 0) < threshold
+
+    def _scoped(q):
+        q = (q.join(Quote, Project.quote_id == Quote.id)
+              .join(Opportunity, Quote.opportunity_id == Opportunity.id)
+              .filter(Project.created_at >= dt_from, Project.created_at <= dt_to))
+
+        if client_id.isdigit():
+            q = q.filter(Project.client_id == int(client_id))
+
+        if flag_only == "1":
+            q = q.filter(Project.margin_percent < threshold)
+
+        if responsible.isdigit():
+            q = q.filter(Project.account_manager_user_id == int(responsible))
+
+        # Cluster scope rule:
+        # If AM is set -> belongs to that AM
+        # Else -> belongs to opp owner (BD)
+        if allowed_ids:
+            q = q.filter(
+                or_(
+                    Project.account_manager_user_id.in_(allowed_ids),
+                    and_(
+                        Project.account_manager_user_id.is_(None),
+                        Opportunity.owner_id.in_(allowed_ids)
+                    )
                 )
             )
-        )
-
-    rows = qs.order_by(Project.id.desc()).all()
-
-    total_contract = Decimal("0")
-    total_cost = Decimal("0")
-    flagged_count = 0
+        return q
+
+    # Tiles: totals over the whole filtered set in one aggregate row
+    sum_cv, sum_tc, flagged = _scoped(
+        db.session.query(
+            func.sum(Project.contract_value),
+            func.sum(Project.total_cost),
+            func.count(case((is_flag_expr, 1))),
+        ).select_from(Project)
+    ).one()
+    total_contract = _safe_dec(sum_cv)
+    total_cost = _safe_dec(sum_tc)
+    flagged_count = int(flagged or 0)
+
+    # Detail rows: AM via one IN query; quote/opp/client come from the joins, owner joined on
+    rows_q = (_scoped(Project.query)
+              .outerjoin(Client, Project.client_id == Client.id)
+              .options(
+                  selectinload(Project.account_manager),
+                  contains_eager(Project.quote).contains_eager(Quote.opportunity).joinedload(Opportunity.owner),
+                  contains_eager(Project.client),
+              )
+              .order_by(Project.id.desc()))
+
+    # PDF exports everything (capped); the HTML table is paged
+    pagination = None
+    if is_pdf:
+        projects = rows_q.limit(_PDF_ROW_CAP).all()
+    else:
+        pagination = rows_q.paginate(page=page, per_page=_PAGE_SIZE, error_out=False)
+        projects = pagination.items
 
     data = []
-    for p in rows:
+    for p in projects:
         cv = _safe_dec(p.contract_value)
         tc = _safe_dec(p.total_cost)
         mp = _safe_dec(p.margin_percent)
 
-        total_contract += cv
-        total_cost += tc
-
-        is_flag = (mp < threshold)
-        if is_flag:
-            flagged_count += 1
-
         if p.account_manager:
             resp_name = p.account_manager.name
         else:
             opp_owner = p.quote.opportunity.owner if p.quote and p.quote.opportunity else None
             resp_name = opp_owner.name if opp_owner else "—"
 
-        data.append({
-            "project": p,
-            "contract_value": cv,
-            "total_cost": tc,
-            "margin_percent": mp,
-            "margin_amount": _safe_dec(p.margin_amount),
-            "is_flag": is_flag,
-            "responsible": resp_name,
-        })
+        data.append(MarginRow(
+            project=p,
+            contract_value=cv,
+            total_cost=tc,
+            margin_percent=mp,
+            margin_amount=_safe_dec(p.margin_amount),
+            is_flag=mp < threshold,
+            responsible=resp_name,
+        ))
 
     overall_margin_pct = Decimal("0")
     if total_contract > 0:
         overall_margin_pct = ((total_contract - total_cost) * Decimal("100")) / total_contract
 
-    clients = Client.query.filter(Client.is_active == True).order_by(Client.company_name.asc()).all()
-    users = User.query.filter(User.is_active == True).order_by(User.name.asc()).all()
+    # dropdowns only need (id, label)
+    clients = (db.session.query(Client.id, Client.company_name)
+               .filter(Client.is_active == True)
+               .order_by(Client.company_name.asc())
+               .all())
+    users = (db.session.query(User.id, User.name)
+             .filter(User.is_active == True)
+             .order_by(User.name.asc())
+             .all())
     clusters = _clusters()
 
     tpl = "reports/cluster_margin_quality.html"
@@ -484,12 +836,13 @@ def cluster_margin_quality():
         clients=clients,
         users=users,
         rows=data,
+        pagination=pagination,
         clusters=clusters,
         cluster_id=cluster_id,
         cluster=cluster,
     )
 
-    if (request.args.get("format") or "").lower() == "pdf":
+    if is_pdf:
         html = render_template(tpl, **ctx)
         return _render_pdf(html, f"cluster_margin_quality_{y:04d}-{m:02d}.pdf")
 
@@ -509,19 +862,26 @@ def cluster_pipeline_conversion():
 
     cluster_id, cluster, allowed_ids = _cluster_filter_params()
 
-    # BD users in scope
-    u_qs = (User.query
-            .join(EmployeeProfile, EmployeeProfile.user_id == User.id)
-            .filter(User.is_active == True))
+    # BD users in scope (role matched in SQL, so non-BD users are never loaded)
+    bd_scope = (db.session.query(User.id)
+                .join(EmployeeProfile, EmployeeProfile.user_id == User.id)
+                .filter(User.is_active == True)
+                .filter(_bd_role_filter()))
     if allowed_ids:
-        u_qs = u_qs.filter(User.id.in_(allowed_ids))
-    users = u_qs.order_by(User.name.asc()).all()
-    bd_users = [u for u in users if _role(u) == "BD"]
+        bd_scope = bd_scope.filter(User.id.in_(allowed_ids))
+
+    # profile comes from the join, so the template doesn't lazy-load it per user
+    bd_users = (User.query
+                .join(EmployeeProfile, EmployeeProfile.user_id == User.id)
+                .options(contains_eager(User.profile))
+                .filter(User.id.in_(bd_scope.scalar_subquery()))
+                .order_by(User.name.asc())
+                .all())
     # Optional fallback: if nobody tagged as BD, you can include all users
     # bd_users = bd_users or users
-    bd_ids = [u.id for u in bd_users]
-    if not bd_ids:
-        bd_ids = [-1]  # safe empty
+
+    # downstream queries scope owners by the same subquery instead of an id list
+    bd_ids = bd_scope.scalar_subquery()
 
     # Leads generated (group by source)
     lead_rows = (db.session.query(
@@ -536,28 +896,33 @@ def cluster_pipeline_conversion():
     leads_by_source = [{"source": (r.source or "Unknown"), "count": int(r.cnt or 0)} for r in lead_rows]
     total_leads = sum(x["count"] for x in leads_by_source)
 
-    # Opportunities created (this month)
-    opp_qs = (Opportunity.query
-              .join(PipelineStage, Opportunity.stage_id == PipelineStage.id)
-              .filter(Opportunity.created_at >= start_date, Opportunity.created_at <= end_date)
-              .filter(Opportunity.owner_id.in_(bd_ids)))
-    total_opps = opp_qs.count()
-
-    qualified_opps = (opp_qs.filter(_qualified_stage_filter())).count()
+    # Opportunities created (this month): total + qualified in one pass
+    total_opps, qualified_opps = (db.session.query(
+                    db.func.count(Opportunity.id),
+                    db.func.count(case((_qualified_stage_filter(), Opportunity.id))),
+                 )
+                 .join(PipelineStage, Opportunity.stage_id == PipelineStage.id)
+                 .filter(Opportunity.created_at >= start_date, Opportunity.created_at <= end_date)
+                 .filter(Opportunity.owner_id.in_(bd_ids))
+                 .one())
+    total_opps = int(total_opps or 0)
+    qualified_opps = int(qualified_opps or 0)
 
-    # Won value (use invoices as source of truth)
+    # Won opportunities (invoices are the source of truth): one row per opportunity
+    # invoiced this month, feeding won count/value and the sales cycle below
     won_rows = (db.session.query(
-                    db.func.count(db.distinct(Opportunity.id)).label("won_count"),
+                    Opportunity.id.label("opp_id"),
                     db.func.coalesce(db.func.sum(Invoice.total_amount), 0).label("won_value"),
-                    db.func.min(Invoice.invoice_date).label("min_inv_date"),
+                    _days_between(db.func.min(Invoice.invoice_date), Opportunity.created_at).label("cycle_days"),
                 )
-                .join(Quote, Quote.id == Invoice.quote_id)
-                .join(Opportunity, Opportunity.id == Quote.opportunity_id)
+                .join(Quote, Quote.opportunity_id == Opportunity.id)
+                .join(Invoice, Invoice.quote_id == Quote.id)
                 .filter(Invoice.invoice_date >= start_date, Invoice.invoice_date <= end_date)
                 .filter(Opportunity.owner_id.in_(bd_ids))
+                .group_by(Opportunity.id, Opportunity.created_at)
                 .all())
-    won_count = int(won_rows[0].won_count or 0) if won_rows else 0
-    won_value = _safe_dec(won_rows[0].won_value) if won_rows else Decimal("0")
+    won_count = len(won_rows)
+    won_value = sum((_safe_dec(r.won_value) for r in won_rows), Decimal("0"))
 
     conversion_pct = Decimal("0")
     if qualified_opps > 0:
@@ -567,28 +932,8 @@ def cluster_pipeline_conversion():
     if won_count > 0:
         avg_deal_size = won_value / Decimal(won_count)
 
-    # Sales cycle days (avg: invoice_date - opportunity.created_at)
-    cycle_rows = (db.session.query(
-                    Opportunity.id.label("opp_id"),
-                    Opportunity.created_at.label("opp_created"),
-                    db.func.min(Invoice.invoice_date).label("first_invoice_date")
-                 )
-                 .join(Quote, Quote.opportunity_id == Opportunity.id)
-                 .join(Invoice, Invoice.quote_id == Quote.id)
-                 .filter(Invoice.invoice_date >= start_date, Invoice.invoice_date <= end_date)
-                 .filter(Opportunity.owner_id.in_(bd_ids))
-                 .group_by(Opportunity.id, Opportunity.created_at)
-                 .all())
-
-    cycle_days = []
-    for r in cycle_rows:
-        if r.first_invoice_date and r.opp_created:
-            try:
-                cd = (r.first_invoice_date - r.opp_created.date()).days
-                if cd >= 0:
-                    cycle_days.append(cd)
-            except Exception:
-                pass
+    # Sales cycle days (avg: first invoice_date - opportunity.created_at, diffed in SQL)
+    cycle_days = [r.cycle_days for r in won_rows if r.cycle_days is not None and r.cycle_days >= 0]
 
     avg_cycle_days = (sum(cycle_days) / len(cycle_days)) if cycle_days else 0
 
@@ -640,8 +985,10 @@ def cluster_account_health():
     # Reference date for "last 30/60/90"
     ref_date = min(date.today(), end_date)
 
+    # profile comes from the join, so _role(u) doesn't lazy-load it per user
     u_qs = (User.query
             .join(EmployeeProfile, EmployeeProfile.user_id == User.id)
+            .options(contains_eager(User.profile))
             .filter(User.is_active == True))
     if allowed_ids:
         u_qs = u_qs.filter(User.id.in_(allowed_ids))
@@ -653,41 +1000,25 @@ def cluster_account_health():
 
     # Clients assigned to AM: via Project.account_manager_user_id
     # (If later you add Client.account_manager_user_id, we can switch to that.)
-    client_rows = (db.session.query(
-                        Project.account_manager_user_id.label("am_id"),
-                        Project.client_id.label("client_id"),
-                        db.func.max(Project.id).label("any_project")
-                   )
-                   .filter(Project.account_manager_user_id.in_(am_ids))
-                   .filter(Project.client_id.isnot(None))
-                   .group_by(Project.account_manager_user_id, Project.client_id)
+    # distinct (am, client) pairs joined to Client in the same round trip
+    pairs = (db.session.query(
+                    Project.account_manager_user_id.label("am_id"),
+                    Project.client_id.label("client_id"),
+                )
+                .filter(Project.account_manager_user_id.in_(am_ids))
+                .filter(Project.client_id.isnot(None))
+                .distinct()
+                .subquery())
+    client_rows = (db.session.query(pairs.c.am_id, Client)
+                   .join(Client, Client.id == pairs.c.client_id)
+                   .order_by(pairs.c.am_id, Client.id)
                    .all())
 
-    # build AM -> client_ids
+    # AM -> clients (ordered by client id)
     am_to_clients = {}
-    for r in client_rows:
-        am_to_clients.setdefault(int(r.am_id), set()).add(int(r.client_id))
-
-    # Preload clients
-    all_client_ids = sorted({cid for s in am_to_clients.values() for cid in s})
-    clients_map = {}
-    if all_client_ids:
-        cl = Client.query.filter(Client.id.in_(all_client_ids)).all()
-        clients_map = {c.id: c for c in cl}
-
-    def _sum_rev(client_id, d_from, d_to):
-        v = (db.session.query(db.func.coalesce(db.func.sum(Invoice.total_amount), 0))
-             .filter(Invoice.client_id == client_id)
-             .filter(Invoice.invoice_date >= d_from, Invoice.invoice_date <= d_to)
-             .filter(Invoice.status != "Cancelled")
-             .scalar()) or 0
-        return _safe_dec(v)
-
-    def _last_invoice_date(client_id):
-        return (db.session.query(db.func.max(Invoice.invoice_date))
-                .filter(Invoice.client_id == client_id)
-                .filter(Invoice.status != "Cancelled")
-                .scalar())
+    for am_id, c in client_rows:
+        am_to_clients.setdefault(am_id, []).append(c)
+    all_client_ids = sorted({c.id for _, c in client_rows})
 
     # windows
     d30_from = ref_date - timedelta(days=29)
@@ -696,43 +1027,49 @@ def cluster_account_health():
     prev30_from = ref_date - timedelta(days=59)
     prev30_to = ref_date - timedelta(days=30)
 
+    def _window_sum(d_from, d_to):
+        in_window = and_(Invoice.invoice_date >= d_from, Invoice.invoice_date <= d_to)
+        return func.coalesce(func.sum(case((in_window, Invoice.total_amount), else_=0)), 0)
+
+    # One GROUP BY for every client: 30/60/90/prev-30 revenue + last invoice date
+    inv_stats = {}
+    if all_client_ids:
+        stats_q = (db.session.query(
+                        Invoice.client_id,
+                        _window_sum(d30_from, ref_date).label("rev_30"),
+                        _window_sum(d60_from, ref_date).label("rev_60"),
+                        _window_sum(d90_from, ref_date).label("rev_90"),
+                        _window_sum(prev30_from, prev30_to).label("prev_30"),
+                        func.max(Invoice.invoice_date).label("last_inv"),
+                    )
+                    .filter(Invoice.client_id.in_(all_client_ids))
+                    .filter(Invoice.status != "Cancelled")
+                    .group_by(Invoice.client_id))
+        inv_stats = {r.client_id: r for r in stats_q}
+
     rows = []
     active_clients = 0
     dormant_risk = 0
     inactive_accounts = 0
 
     for am in am_users:
-        cids = sorted(list(am_to_clients.get(am.id, set())))
-        for cid in cids:
-            c = clients_map.get(cid)
-            if not c:
-                continue
+        for c in am_to_clients.get(am.id, ()):
+            st = inv_stats.get(c.id)
+            rev_30 = _safe_dec(st.rev_30) if st else _ZERO
+            rev_60 = _safe_dec(st.rev_60) if st else _ZERO
+            rev_90 = _safe_dec(st.rev_90) if st else _ZERO
 
-            rev_30 = _sum_rev(cid, d30_from, ref_date)
-            rev_60 = _sum_rev(cid, d60_from, ref_date)
-            rev_90 = _sum_rev(cid, d90_from, ref_date)
-
-            prev_30 = _sum_rev(cid, prev30_from, prev30_to)
+            prev_30 = _safe_dec(st.prev_30) if st else _ZERO
             trend = "Stable"
             if rev_30 > (prev_30 * Decimal("1.10")):
                 trend = "Up"
             elif rev_30 < (prev_30 * Decimal("0.90")):
                 trend = "Down"
 
-            last_inv = _last_invoice_date(cid)
+            last_inv = st.last_inv if st else None
 
             # health status
-            status = "Active"
-            if last_inv is None:
-                status = "Inactive"
-            else:
-                gap = (ref_date - last_inv).days
-                if gap > 90:
-                    status = "Inactive"
-                elif gap > 60:
-                    status = "Dormant Risk"
-                else:
-                    status = "Active"
+            status = _health_status(last_inv, ref_date)
 
             if status == "Active":
                 active_clients += 1
@@ -824,9 +1161,12 @@ def my_dashboard():
         # BD / default
         inv_q = inv_q.filter(Opportunity.owner_id == me.id)
 
-    inv_mtd = inv_q.order_by(Invoice.invoice_date.desc(), Invoice.id.desc()).all()
-
-    revenue_mtd = sum([_safe_dec(i.total_amount) for i in inv_mtd], Decimal("0"))
+    # only the count and total are shown: aggregate instead of loading the invoices
+    invoices_mtd, revenue_mtd = inv_q.with_entities(
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.total_amount), 0),
+    ).one()
+    revenue_mtd = _safe_dec(revenue_mtd)
 
     # outstanding (all-time outstanding in their scope)
     inv_out_q = (Invoice.query
@@ -847,25 +1187,41 @@ def my_dashboard():
     else:
         inv_out_q = inv_out_q.filter(Opportunity.owner_id == me.id)
 
-    inv_all = inv_out_q.order_by(Invoice.id.desc()).all()
+    # Stream the scope in batches: paid amount and client ride along on each row,
+    # so nothing lazy-loads mid-stream; keep a running total and the 8 oldest dues.
+    paid_sq = _invoice_paid_subquery()
+    remaining = (func.coalesce(Invoice.total_amount, 0) - func.coalesce(paid_sq.c.paid, 0)).label("remaining")
+    inv_rows = (inv_out_q
+                .outerjoin(paid_sq, paid_sq.c.invoice_id == Invoice.id)
+                .filter(remaining > 0)
+                .options(joinedload(Invoice.client))
+                .add_columns(remaining)
+                .order_by(Invoice.id.desc())
+                .yield_per(500))
 
     outstanding_total = Decimal("0")
-    overdue_top = []
-    for inv in inv_all:
-        rem = _safe_dec(inv.remaining_amount() or 0)
+    oldest = []  # min-heap of (days_out, -seq, inv, rem, due), at most 8 entries
+    for seq, (inv, rem) in enumerate(inv_rows):
+        rem = _safe_dec(rem)
         if rem <= 0:
             continue
         due = inv.due_date or inv.invoice_date
         days_out = (today - due).days if due else 0
         outstanding_total += rem
-        overdue_top.append({
-            "invoice": inv,
-            "remaining": rem,
-            "due_date": due,
-            "days_outstanding": days_out,
-            "client_name": (inv.client.company_name if getattr(inv, "client", None) else "—"),
-        })
-    overdue_top = sorted(overdue_top, key=lambda r: r["days_outstanding"], reverse=True)[:8]
+        # -seq breaks ties towards the newer invoice, as the old stable sort did
+        entry = (days_out, -seq, inv, rem, due)
+        if len(oldest) < 8:
+            heapq.heappush(oldest, entry)
+        elif entry[:2] > oldest[0][:2]:
+            heapq.heapreplace(oldest, entry)
+
+    overdue_top = [{
+        "invoice": inv,
+        "remaining": rem,
+        "due_date": due,
+        "days_outstanding": days_out,
+        "client_name": (inv.client.company_name if getattr(inv, "client", None) else "—"),
+    } for days_out, _, inv, rem, due in sorted(oldest, key=lambda e: e[:2], reverse=True)]
 
     # -------------------------
     # Pipeline snapshot (BD-oriented)
@@ -907,18 +1263,18 @@ def my_dashboard():
         # BD: projects with no AM, owned by BD OR if AM assigned, still show if opp owner is me (useful for BD visibility)
         proj_q = proj_q.filter(Opportunity.owner_id == me.id)
 
-    projects = proj_q.order_by(Project.id.desc()).all()
+    # newest 8 below threshold (NULL margin counts as 0%, as _safe_dec does)
+    projects = (proj_q
+                .filter(func.coalesce(Project.margin_percent, 0) < threshold)
+                .order_by(Project.id.desc())
+                .limit(8)
+                .all())
 
-    flagged_projects = []
-    for p in projects:
-        mp = _safe_dec(p.margin_percent)
-        if mp < threshold:
-            flagged_projects.append({
-                "project": p,
-                "margin_percent": mp,
-                "contract_value": _safe_dec(p.contract_value),
-            })
-    flagged_projects = flagged_projects[:8]
+    flagged_projects = [{
+        "project": p,
+        "margin_percent": _safe_dec(p.margin_percent),
+        "contract_value": _safe_dec(p.contract_value),
+    } for p in projects]
 
     # -------------------------
     # Pending finance verifications affecting "my" invoices (optional)
@@ -964,29 +1320,22 @@ def my_dashboard():
             cl = Client.query.filter(Client.id.in_(my_client_ids4)).all()
             clients_map = {c.id: c for c in cl}
 
-        def _last_invoice_date(client_id):
-            return (db.session.query(db.func.max(Invoice.invoice_date))
-                    .filter(Invoice.client_id == client_id)
-                    .filter(Invoice.status != "Cancelled")
-                    .scalar())
+        # last invoice date for all my clients in one GROUP BY
+        last_inv_map = {}
+        if my_client_ids4:
+            last_inv_map = dict(db.session.query(Invoice.client_id, func.max(Invoice.invoice_date))
+                                .filter(Invoice.client_id.in_(my_client_ids4))
+                                .filter(Invoice.status != "Cancelled")
+                                .group_by(Invoice.client_id)
+                                .all())
 
         for cid in my_client_ids4:
             c = clients_map.get(cid)
             if not c:
                 continue
 
-            last_inv = _last_invoice_date(cid)
-            status = "Active"
-            if last_inv is None:
-                status = "Inactive"
-            else:
-                gap = (ref_date - last_inv).days
-                if gap > 90:
-                    status = "Inactive"
-                elif gap > 60:
-                    status = "Dormant Risk"
-                else:
-                    status = "Active"
+            last_inv = last_inv_map.get(cid)
+            status = _health_status(last_inv, ref_date)
 
             if status == "Active":
                 active_clients += 1
@@ -1012,7 +1361,7 @@ def my_dashboard():
         my_role=my_role,
 
         revenue_mtd=revenue_mtd,
-        invoices_mtd=len(inv_mtd),
+        invoices_mtd=invoices_mtd,
 
         outstanding_total=outstanding_total,
         overdue_top=overdue_top,
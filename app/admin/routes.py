@@ -1,46 +1,75 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, g, has_app_context
 from flask_login import login_required, current_user
-from sqlalchemy import func, distinct, case, or_
+from sqlalchemy import func, distinct, case, or_, and_, event, true
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 from typing import List
-from datetime import date, timedelta
+from itertools import chain
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
 
 from .. import db
 from ..models import (
     LeadStatus, LeadSource, ActivityType, AuditLog, LeadActivity, QuoteApproval,
     User, EmployeeProfile,
     Lead, Opportunity, Quote, PaymentCollection,
-    PipelineStage, QuoteStatus, Cluster
+    PipelineStage, QuoteStatus, Cluster, Client
 )
-from ..utils import require_perm
+from ..utils import require_perm, request_memo, TTLCache, is_duplicate_key
+from ..services.team import team_user_ids
+from .reports import invalidate_cluster_options
 
 admin_bp = Blueprint("admin", __name__, template_folder="../templates")
 
+# dashboard aggregates per (tenant, owner set); plain numbers/tuples only, never ORM rows
+_DASHBOARD_KPI_CACHE = TTLCache(ttl=60)
+_DASHBOARD_KPI_MODELS = (Lead, Opportunity, Quote, PaymentCollection)
+
+# tenant slug -> {activity_type_id: ActivityTypeRow}; tiny lookup table, reset by the master's writes
+ActivityTypeRow = namedtuple("ActivityTypeRow", "id name icon")
+_ACTIVITY_TYPE_CACHE = TTLCache(ttl=300)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_dashboard_kpis(session, flush_context):
+    # any write to a model the KPIs read drops this worker's cached aggregates
+    # (and anything memoized earlier in the same request)
+    if any(isinstance(obj, _DASHBOARD_KPI_MODELS)
+           for obj in chain(session.new, session.dirty, session.deleted)):
+        _DASHBOARD_KPI_CACHE.clear()
+        if has_app_context():
+            g.pop("_request_memo", None)
+
 
 # =========================================================
 # DASHBOARD HELPERS
 # =========================================================
 def get_team_user_ids(manager_user_id: int, include_self: bool = False) -> List[int]:
-    seen = set([manager_user_id]) if include_self else set()
-    queue = [manager_user_id]
-
-    while queue:
-        mid = queue.pop(0)
-        rows = (
-            db.session.query(EmployeeProfile.user_id)
-            .filter(EmployeeProfile.reporting_manager_user_id == mid)
-            .all()
-        )
-        for (uid,) in rows:
-            if uid not in seen:
-                seen.add(uid)
-                queue.append(uid)
+    # whole reporting subtree in one employee_closure range scan. Kept as a list (not a
+    # subquery inside each KPI statement): the dashboards need the ids anyway for the
+    # team count and per-member rows, and dashboard_kpis/request_memo key on the id set.
+    return team_user_ids(manager_user_id, include_self=include_self)
 
-    return list(seen)
+
+def _opportunity_card_query():
+    # just the columns the dashboard cards render, with client/stage joined in
+    # (plain rows: no ORM hydration, no lazy load per card)
+    return (
+        db.session.query(
+            Opportunity.id, Opportunity.title, Opportunity.company,
+            Opportunity.expected_value, Opportunity.expected_close_date,
+            Client.company_name.label("client_name"),
+            PipelineStage.name.label("stage_name"),
+            PipelineStage.color.label("stage_color"),
+        )
+        .outerjoin(Client, Opportunity.client_id == Client.id)
+        .outerjoin(PipelineStage, Opportunity.stage_id == PipelineStage.id)
+    )
 
 
 def recent_opportunities(owner_ids: List[int], limit: int = 8):
     return (
-        Opportunity.query
+        _opportunity_card_query()
         .filter(Opportunity.owner_id.in_(owner_ids))
         .order_by(Opportunity.created_at.desc())
         .limit(limit)
@@ -48,130 +77,216 @@ def recent_opportunities(owner_ids: List[int], limit: int = 8):
     )
 
 
-def kpi_leads(owner_ids: List[int]):
-    total = (
-        db.session.query(func.count(Lead.id))
-        .filter(Lead.owner_id.in_(owner_ids))
-        .scalar()
-    ) or 0
+def _names_by_id(model) -> dict:
+    """{id: name} for a small lookup table (statuses / stages), loaded once per request."""
+    lookups = g.setdefault("_names_by_id", {})
+    if model not in lookups:
+        lookups[model] = dict(db.session.query(model.id, model.name).all())
+    return lookups[model]
 
-    by_status = (
-        db.session.query(LeadStatus.name, func.count(Lead.id))
-        .join(LeadStatus, Lead.status_id == LeadStatus.id)
-        .filter(Lead.owner_id.in_(owner_ids))
-        .group_by(LeadStatus.name)
-        .order_by(func.count(Lead.id).desc())
-        .all()
-    )
-    return int(total), by_status
+
+def _named_breakdown(rows, model):
+    """
+    rows of (fk_id, count, ...) grouped on the FK -> [(name, count)] by count desc.
+    Grouping on the id keeps the join out of the aggregate; unknown/NULL ids are dropped
+    here (they still count towards the caller's totals).
+    """
+    names = _names_by_id(model)
+    out = [(names[r[0]], r[1]) for r in rows if r[0] in names]
+    out.sort(key=lambda x: x[1], reverse=True)
+    return out
 
 
-def kpi_clients_from_leads(owner_ids: List[int]) -> int:
-    val = (
-        db.session.query(func.count(distinct(Lead.client_id)))
+@request_memo
+def kpi_leads(owner_ids: List[int]):
+    # one GROUP BY on the FK; the NULL group (no status) only feeds the total
+    rows = (
+        db.session.query(Lead.status_id, func.count(Lead.id))
         .filter(Lead.owner_id.in_(owner_ids))
-        .filter(Lead.client_id.isnot(None))
-        .scalar()
-    ) or 0
-    return int(val)
+        .group_by(Lead.status_id)
+        .all()
+    )
+    total = sum(cnt for _, cnt in rows)
+    return int(total), _named_breakdown(rows, LeadStatus)
 
 
+@request_memo
 def kpi_pipeline(owner_ids: List[int]):
-    total = (
-        db.session.query(func.count(Opportunity.id))
-        .filter(Opportunity.owner_id.in_(owner_ids))
-        .scalar()
-    ) or 0
-
-    value = (
-        db.session.query(func.coalesce(func.sum(Opportunity.expected_value), 0))
-        .filter(Opportunity.owner_id.in_(owner_ids))
-        .scalar()
-    ) or 0
-
-    by_stage = (
-        db.session.query(PipelineStage.name, func.count(Opportunity.id))
-        .join(PipelineStage, Opportunity.stage_id == PipelineStage.id)
+    # count + value per stage in one GROUP BY; totals are the sum over all groups
+    rows = (
+        db.session.query(
+            Opportunity.stage_id,
+            func.count(Opportunity.id),
+            func.coalesce(func.sum(Opportunity.expected_value), 0)
+        )
         .filter(Opportunity.owner_id.in_(owner_ids))
-        .group_by(PipelineStage.name)
-        .order_by(func.count(Opportunity.id).desc())
+        .group_by(Opportunity.stage_id)
         .all()
     )
+    total = sum(cnt for _, cnt, _ in rows)
+    value = sum(val for _, _, val in rows)
+    by_stage = _named_breakdown(rows, PipelineStage)
 
     return int(total), float(value), by_stage
 
 
+@request_memo
 def kpi_quotes(owner_ids: List[int]):
-    total = (
-        db.session.query(func.count(Quote.id))
+    # same shape as kpi_pipeline: one GROUP BY, totals summed over the groups
+    rows = (
+        db.session.query(
+            Quote.status_id,
+            func.count(Quote.id),
+            func.coalesce(func.sum(Quote.total_amount), 0)
+        )
         .filter(Quote.created_by_id.in_(owner_ids))
-        .scalar()
-    ) or 0
+        .group_by(Quote.status_id)
+        .all()
+    )
+    total = sum(cnt for _, cnt, _ in rows)
+    amount = sum(amt for _, _, amt in rows)
+    by_status = _named_breakdown(rows, QuoteStatus)
 
-    amount = (
-        db.session.query(func.coalesce(func.sum(Quote.total_amount), 0))
-        .filter(Quote.created_by_id.in_(owner_ids))
-        .scalar()
-    ) or 0
+    return int(total), float(amount), by_status
+
+
+_PAYMENT_STATUSES = ("Pending", "Verified", "Rejected")
 
-    by_status = (
-        db.session.query(QuoteStatus.name, func.count(Quote.id))
-        .join(QuoteStatus, Quote.status_id == QuoteStatus.id)
+
+def _collected_by_quote_subquery(owner_ids: List[int]):
+    # non-rejected collections per quote, limited to the owners' quotes so the
+    # GROUP BY never scans the whole payment_collections table
+    return (
+        db.session.query(
+            PaymentCollection.quote_id.label("q_id"),
+            func.coalesce(func.sum(
+                case((PaymentCollection.status != "Rejected", PaymentCollection.amount), else_=0)
+            ), 0).label("collected_amt")
+        )
+        .join(Quote, Quote.id == PaymentCollection.quote_id)
         .filter(Quote.created_by_id.in_(owner_ids))
-        .group_by(QuoteStatus.name)
-        .order_by(func.count(Quote.id).desc())
-        .all()
+        .group_by(PaymentCollection.quote_id)
+        .subquery()
     )
 
-    return int(total), float(amount), by_status
 
+@request_memo
+def kpi_totals(owner_ids: List[int]) -> dict:
+    """
+    Scalar dashboard KPIs (clients, close dates, payments, outstanding) in one statement:
+    each base table is aggregated once into a one-row derived table and the rows are
+    cross-joined, so this is a single round trip instead of four.
+    """
+    today = date.today()
+    week_end = today + timedelta(days=7)
 
-def kpi_payments(owner_ids: List[int]) -> dict:
-    rows = (
+    lead_m = (
+        db.session.query(func.count(distinct(Lead.client_id)).label("clients"))
+        .filter(Lead.owner_id.in_(owner_ids))
+        .filter(Lead.client_id.isnot(None))
+        .subquery("lead_m")
+    )
+    opp_m = (
         db.session.query(
-            PaymentCollection.status,
-            func.coalesce(func.sum(PaymentCollection.amount), 0)
+            func.count(case((Opportunity.expected_close_date.between(today, week_end), Opportunity.id)))
+            .label("closing_this_week"),
+            func.count(case((Opportunity.expected_close_date < today, Opportunity.id))).label("overdue"),
         )
+        .filter(Opportunity.owner_id.in_(owner_ids))
+        .filter(Opportunity.expected_close_date.isnot(None))
+        .subquery("opp_m")
+    )
+    pay_m = (
+        db.session.query(*(
+            func.coalesce(func.sum(
+                case((PaymentCollection.status == status, PaymentCollection.amount), else_=0)
+            ), 0).label(status.lower())
+            for status in _PAYMENT_STATUSES
+        ))
         .filter(PaymentCollection.created_by_id.in_(owner_ids))
-        .group_by(PaymentCollection.status)
-        .all()
+        .subquery("pay_m")
+    )
+    collected_subq = _collected_by_quote_subquery(owner_ids)
+    quote_m = (
+        db.session.query(
+            func.coalesce(func.sum(Quote.total_amount - func.coalesce(collected_subq.c.collected_amt, 0)), 0)
+            .label("outstanding")
+        )
+        .outerjoin(collected_subq, collected_subq.c.q_id == Quote.id)
+        .filter(Quote.created_by_id.in_(owner_ids))
+        .subquery("quote_m")
     )
 
-    out = {"Pending": 0.0, "Verified": 0.0, "Rejected": 0.0}
-    for status, amt in rows:
-        out[status] = float(amt)
+    # every derived table is a bare aggregate, so each yields exactly one row
+    row = (
+        db.session.query(lead_m, opp_m, pay_m, quote_m)
+        .select_from(lead_m.join(opp_m, true()).join(pay_m, true()).join(quote_m, true()))
+        .one()
+    )
 
-    out["total"] = float(out["Pending"] + out["Verified"] + out["Rejected"])
-    return out
+    payments = {status: float(getattr(row, status.lower()) or 0) for status in _PAYMENT_STATUSES}
+    payments["total"] = float(sum(payments.values()))
+    return {
+        "clients": int(row.clients or 0),
+        "opp_closure": {"closing_this_week": int(row.closing_this_week or 0), "overdue": int(row.overdue or 0)},
+        "payments": payments,
+        "outstanding": float(row.outstanding or 0),
+    }
 
 
-def kpi_outstanding(owner_ids: List[int]) -> float:
-    collected_subq = (
+def kpi_per_owner(owner_ids: List[int]) -> dict:
+    """
+    Per-user leads / clients / payments / outstanding for the team table:
+    three GROUP BY queries for the whole team instead of four queries per user.
+    """
+    empty = {"leads": 0, "clients": 0, **dict.fromkeys(_PAYMENT_STATUSES, 0.0), "outstanding": 0.0}
+    out = {uid: dict(empty) for uid in owner_ids}
+
+    lead_rows = (
+        db.session.query(Lead.owner_id, func.count(Lead.id), func.count(distinct(Lead.client_id)))
+        .filter(Lead.owner_id.in_(owner_ids))
+        .group_by(Lead.owner_id)
+        .all()
+    )
+    for uid, leads, clients in lead_rows:
+        out[uid]["leads"] = int(leads or 0)
+        out[uid]["clients"] = int(clients or 0)
+
+    pay_rows = (
         db.session.query(
-            PaymentCollection.quote_id.label("q_id"),
-            func.coalesce(func.sum(
-                case((PaymentCollection.status != "Rejected", PaymentCollection.amount), else_=0)
-            ), 0).label("collected_amt")
+            PaymentCollection.created_by_id,
+            PaymentCollection.status,
+            func.coalesce(func.sum(PaymentCollection.amount), 0)
         )
-        .group_by(PaymentCollection.quote_id)
-        .subquery()
+        .filter(PaymentCollection.created_by_id.in_(owner_ids))
+        .group_by(PaymentCollection.created_by_id, PaymentCollection.status)
+        .all()
     )
+    for uid, status, amt in pay_rows:
+        out[uid][status] = float(amt)
 
-    outstanding = (
+    collected_subq = _collected_by_quote_subquery(owner_ids)
+    outstanding_rows = (
         db.session.query(
+            Quote.created_by_id,
             func.coalesce(func.sum(Quote.total_amount - func.coalesce(collected_subq.c.collected_amt, 0)), 0)
         )
         .outerjoin(collected_subq, collected_subq.c.q_id == Quote.id)
         .filter(Quote.created_by_id.in_(owner_ids))
-        .scalar()
-    ) or 0
+        .group_by(Quote.created_by_id)
+        .all()
+    )
+    for uid, amt in outstanding_rows:
+        out[uid]["outstanding"] = float(amt or 0)
 
-    return float(outstanding)
+    return out
 
 
 def recent_leads(owner_ids: List[int], limit: int = 8):
     return (
-        Lead.query
+        db.session.query(
+            Lead.id, Lead.name, Lead.company, Lead.status_id, Lead.owner_id, Lead.created_at
+        )
         .filter(Lead.owner_id.in_(owner_ids))
         .order_by(Lead.created_at.desc())
         .limit(limit)
@@ -181,7 +296,10 @@ def recent_leads(owner_ids: List[int], limit: int = 8):
 
 def recent_payments(owner_ids: List[int], limit: int = 8):
     return (
-        PaymentCollection.query
+        db.session.query(
+            PaymentCollection.id, PaymentCollection.quote_id, PaymentCollection.amount,
+            PaymentCollection.status, PaymentCollection.payment_date, PaymentCollection.created_at
+        )
         .filter(PaymentCollection.created_by_id.in_(owner_ids))
         .order_by(PaymentCollection.created_at.desc())
         .limit(limit)
@@ -189,34 +307,53 @@ def recent_payments(owner_ids: List[int], limit: int = 8):
     )
 
 
+def _activity_types() -> dict:
+    slug = getattr(g, "tenant_slug", None)
+    types = _ACTIVITY_TYPE_CACHE.get(slug)
+    if types is None:
+        rows = db.session.query(ActivityType.id, ActivityType.name, ActivityType.icon)
+        types = _ACTIVITY_TYPE_CACHE.set(slug, {r.id: ActivityTypeRow(*r) for r in rows})
+    return types
+
+
+def _invalidate_activity_types():
+    _ACTIVITY_TYPE_CACHE.pop(getattr(g, "tenant_slug", None))
+
+
 def kpi_followups(owner_ids, limit: int = 10):
     today = date.today()
+    day_start = datetime.combine(today, time.min)
+    day_end = day_start + timedelta(days=1)
+    follow_up = LeadActivity.next_follow_up_at
 
+    # window aggregates run over the whole filtered set before LIMIT,
+    # so total / due today / overdue come back on every listed row;
+    # activity types come from the cached lookup, so only two tables are joined
     rows = (
-        db.session.query(LeadActivity, Lead, ActivityType)
+        db.session.query(
+            LeadActivity, Lead,
+            func.count().over(),
+            func.count(case((and_(follow_up >= day_start, follow_up < day_end), 1))).over(),
+            func.count(case((follow_up < day_start, 1))).over(),
+        )
         .join(Lead, LeadActivity.lead_id == Lead.id)
-        .outerjoin(ActivityType, LeadActivity.activity_type_id == ActivityType.id)
         .filter(Lead.owner_id.in_(owner_ids))
-        .filter(LeadActivity.next_follow_up_at.isnot(None))
-        .order_by(LeadActivity.next_follow_up_at.asc())
+        .filter(follow_up.isnot(None))
+        .order_by(follow_up.asc())
         .limit(limit)
         .all()
     )
 
-    followups = []
-    due_today = 0
-    overdue = 0
+    total, due_today, overdue = rows[0][2:] if rows else (0, 0, 0)
+    atypes = _activity_types() if rows else {}
 
-    for act, lead, atype in rows:
+    followups = []
+    for act, lead, *_ in rows:
+        atype = atypes.get(act.activity_type_id)
         d = act.next_follow_up_at.date() if act.next_follow_up_at else None
         is_today = (d == today) if d else False
         is_overdue = (d < today) if d else False
 
-        if is_today:
-            due_today += 1
-        if is_overdue:
-            overdue += 1
-
         followups.append({
             "activity": act,
             "lead": lead,
@@ -225,14 +362,6 @@ def kpi_followups(owner_ids, limit: int = 10):
             "is_overdue": is_overdue,
         })
 
-    total = (
-        db.session.query(func.count(LeadActivity.id))
-        .join(Lead, LeadActivity.lead_id == Lead.id)
-        .filter(Lead.owner_id.in_(owner_ids))
-        .filter(LeadActivity.next_follow_up_at.isnot(None))
-        .scalar()
-    ) or 0
-
     return {
         "total": int(total),
         "due_today": int(due_today),
@@ -242,79 +371,71 @@ def kpi_followups(owner_ids, limit: int = 10):
 
 
 # -------- NEW: Opportunity urgency KPIs --------
-def kpi_opportunity_closures(owner_ids):
-    today = date.today()
-    week_end = today + timedelta(days=7)
-
-    closing_this_week = (
-        db.session.query(func.count(Opportunity.id))
-        .filter(Opportunity.owner_id.in_(owner_ids))
-        .filter(Opportunity.expected_close_date.isnot(None))
-        .filter(Opportunity.expected_close_date.between(today, week_end))
-        .scalar()
-    ) or 0
-
-    overdue = (
-        db.session.query(func.count(Opportunity.id))
-        .filter(Opportunity.owner_id.in_(owner_ids))
-        .filter(Opportunity.expected_close_date.isnot(None))
-        .filter(Opportunity.expected_close_date < today)
-        .scalar()
-    ) or 0
-
-    return {"closing_this_week": int(closing_this_week), "overdue": int(overdue)}
+# the closing-soon list only reaches this far back; older overdue deals are only counted (kpi_totals)
+_CLOSING_SOON_OVERDUE_DAYS = 30
 
 
 def opportunities_closing_soon(owner_ids, limit=8):
     today = date.today()
     week_end = today + timedelta(days=7)
+    overdue_from = today - timedelta(days=_CLOSING_SOON_OVERDUE_DAYS)
 
+    # bounded range on (owner_id, expected_close_date), not every past-due row ever
     return (
-        Opportunity.query
+        _opportunity_card_query()
         .filter(Opportunity.owner_id.in_(owner_ids))
-        .filter(Opportunity.expected_close_date.isnot(None))
-        .filter(Opportunity.expected_close_date <= week_end)
+        .filter(Opportunity.expected_close_date.between(overdue_from, week_end))
         .order_by(Opportunity.expected_close_date.asc())
         .limit(limit)
         .all()
     )
 
 
-def build_dashboard_context(owner_ids):
-    lead_total, lead_by_status = kpi_leads(owner_ids)
-    clients = kpi_clients_from_leads(owner_ids)
-
-    opp_total, opp_value, opp_by_stage = kpi_pipeline(owner_ids)
-
-    quote_total, quote_amount, quote_by_status = kpi_quotes(owner_ids)
-    payments = kpi_payments(owner_ids)
-    outstanding = kpi_outstanding(owner_ids)
-
-    followups = kpi_followups(owner_ids, limit=10)
-
-    opp_closure = kpi_opportunity_closures(owner_ids)
-    closing_opps = opportunities_closing_soon(owner_ids, limit=8)
-
-    return {
-        "kpi": {
+def dashboard_kpis(owner_ids) -> dict:
+    """
+    Aggregate KPIs for owner_ids, cached for 60s per (tenant, owner set).
+    Cleared on any Lead/Opportunity/Quote/PaymentCollection flush in this worker;
+    the TTL bounds staleness in the others.
+    """
+    key = (getattr(g, "tenant_slug", None), tuple(sorted(owner_ids)))
+    kpis = _DASHBOARD_KPI_CACHE.get(key)
+    if kpis is None:
+        lead_total, lead_by_status = kpi_leads(owner_ids)
+        opp_total, opp_value, opp_by_stage = kpi_pipeline(owner_ids)
+        quote_total, quote_amount, quote_by_status = kpi_quotes(owner_ids)
+        totals = kpi_totals(owner_ids)
+
+        kpis = _DASHBOARD_KPI_CACHE.set(key, {
             "lead_total": lead_total,
-            "lead_by_status": lead_by_status,
-            "clients": clients,
+            "lead_by_status": tuple(lead_by_status),
+            "clients": totals["clients"],
 
             "opp_total": opp_total,
             "opp_value": opp_value,
-            "opp_by_stage": opp_by_stage,
-            "opp_closure": opp_closure,
+            "opp_by_stage": tuple(opp_by_stage),
+            "opp_closure": totals["opp_closure"],
 
             "quote_total": quote_total,
             "quote_amount": quote_amount,
-            "quote_by_status": quote_by_status,
+            "quote_by_status": tuple(quote_by_status),
+
+            "payments": totals["payments"],
+            "outstanding": totals["outstanding"],
+        })
+
+    # callers get their own copies of the mutable parts
+    return {k: (dict(v) if isinstance(v, dict) else v) for k, v in kpis.items()}
 
-            "payments": payments,
-            "outstanding": outstanding,
 
-            "followups": followups,
-        },
+def build_dashboard_context(owner_ids):
+    kpi = dashboard_kpis(owner_ids)
+
+    # follow-ups and the recent lists carry ORM rows, so they are always fresh
+    kpi["followups"] = kpi_followups(owner_ids, limit=10)
+    closing_opps = opportunities_closing_soon(owner_ids, limit=8)
+
+    return {
+        "kpi": kpi,
         "recent": {
             "leads": recent_leads(owner_ids),
             "payments": recent_payments(owner_ids),
@@ -336,20 +457,33 @@ def pending_quote_approvals_for_user(user):
         ((QuoteApproval.approver_user_id.is_(None)) & (QuoteApproval.approver_role == role_name))
     )
 
-    items = q.order_by(QuoteApproval.created_at.asc()).limit(8).all()
-    count = q.count()
+    # the window count covers every waiting approval, not just the 8 returned
+    rows = q.add_columns(func.count().over()).order_by(QuoteApproval.created_at.asc()).limit(8).all()
+    items = [appr for appr, _ in rows]
+    count = rows[0][1] if rows else 0
     return {"count": int(count), "items": items}
 
 
+_PAYMENT_QUEUE_BADGE_CAP = 100
+
+
 def pending_payment_queue_for_user(user):
     if not user.is_authenticated:
-        return {"count": 0}
+        return {"count": 0, "capped": False}
 
     if not (user.has_perm("payments.verify") or user.has_perm("payments.admin")):
-        return {"count": 0}
+        return {"count": 0, "capped": False}
 
-    count = PaymentCollection.query.filter(PaymentCollection.status == "Pending").count()
-    return {"count": int(count)}
+    # the badge only needs "how many, up to the cap": count at most cap + 1 pending rows
+    pending = (
+        db.session.query(PaymentCollection.id)
+        .filter(PaymentCollection.status == "Pending")
+        .limit(_PAYMENT_QUEUE_BADGE_CAP + 1)
+        .subquery()
+    )
+    count = db.session.query(func.count()).select_from(pending).scalar() or 0
+    capped = count > _PAYMENT_QUEUE_BADGE_CAP
+    return {"count": min(int(count), _PAYMENT_QUEUE_BADGE_CAP), "capped": capped}
 
 
 # =========================================================
@@ -396,22 +530,19 @@ def team_dashboard():
 
     team_users = User.query.filter(User.id.in_(team_ids)).order_by(User.name.asc()).all()
 
+    per_owner = kpi_per_owner(team_ids) if team_ids else {}
+
     team_rows = []
     for u in team_users:
-        uid = [u.id]
-        lead_total, _ = kpi_leads(uid)
-        clients = kpi_clients_from_leads(uid)
-        payments = kpi_payments(uid)
-        outstanding = kpi_outstanding(uid)
-
+        k = per_owner[u.id]
         team_rows.append({
             "user": u,
-            "leads": lead_total,
-            "clients": clients,
-            "verified": payments.get("Verified", 0),
-            "pending": payments.get("Pending", 0),
-            "rejected": payments.get("Rejected", 0),
-            "outstanding": outstanding
+            "leads": k["leads"],
+            "clients": k["clients"],
+            "verified": k["Verified"],
+            "pending": k["Pending"],
+            "rejected": k["Rejected"],
+            "outstanding": k["outstanding"]
         })
 
     totals = build_dashboard_context(team_ids) if team_ids else None
@@ -431,14 +562,22 @@ def team_structure():
     if len(subtree_ids) <= 1 and not current_user.has_perm("team.structure.view"):
         abort(403)
 
-    # manager -> reports map
+    # the tree is rendered from root_id down, so only the subtree is ever reachable:
+    # load just those profiles/users, as plain rows (no ORM hydration)
     mgr_map = {}
-    profiles = EmployeeProfile.query.all()
-    for p in profiles:
-        if p.reporting_manager_user_id:
-            mgr_map.setdefault(p.reporting_manager_user_id, []).append(p.user_id)
+    profiles = (
+        db.session.query(EmployeeProfile.user_id, EmployeeProfile.reporting_manager_user_id)
+        .filter(EmployeeProfile.reporting_manager_user_id.in_(subtree_ids))
+        .all()
+    )
+    for uid, mgr_id in profiles:
+        mgr_map.setdefault(mgr_id, []).append(uid)
 
-    users = User.query.all()
+    users = (
+        db.session.query(User.id, User.name, User.email)
+        .filter(User.id.in_(subtree_ids))
+        .all()
+    )
     users_by_id = {u.id: u for u in users}
 
     show_all = current_user.has_perm("team.structure.view")
@@ -471,13 +610,16 @@ def lead_status_master():
             flash("Status name is required.", "danger")
             return redirect(url_for("admin.lead_status_master"))
 
-        exists = LeadStatus.query.filter_by(name=name).first()
-        if exists:
+        # lead_statuses.name is UNIQUE: let the DB reject duplicates
+        db.session.add(LeadStatus(name=name, color=color, sort_order=sort_order, is_active=True))
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_duplicate_key(e):
+                raise
             flash("Status name already exists.", "warning")
             return redirect(url_for("admin.lead_status_master"))
-
-        db.session.add(LeadStatus(name=name, color=color, sort_order=sort_order, is_active=True))
-        db.session.commit()
         flash("Status added ✅", "success")
         return redirect(url_for("admin.lead_status_master"))
 
@@ -489,7 +631,7 @@ def lead_status_master():
 @login_required
 @require_perm("masters.manage")
 def update_lead_status(status_id):
-    s = LeadStatus.query.get_or_404(status_id)
+    s = db.session.get(LeadStatus, status_id) or abort(404)
     s.name = (request.form.get("name") or "").strip()
     s.color = (request.form.get("color") or "secondary").strip()
     s.sort_order = int(request.form.get("sort_order") or 0)
@@ -517,13 +659,16 @@ def lead_source_master():
             flash("Source name is required.", "danger")
             return redirect(url_for("admin.lead_source_master"))
 
-        exists = LeadSource.query.filter_by(name=name).first()
-        if exists:
+        # lead_sources.name is UNIQUE: let the DB reject duplicates
+        db.session.add(LeadSource(name=name, sort_order=sort_order, is_active=True))
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_duplicate_key(e):
+                raise
             flash("Source name already exists.", "warning")
             return redirect(url_for("admin.lead_source_master"))
-
-        db.session.add(LeadSource(name=name, sort_order=sort_order, is_active=True))
-        db.session.commit()
         flash("Source added ✅", "success")
         return redirect(url_for("admin.lead_source_master"))
 
@@ -535,7 +680,7 @@ def lead_source_master():
 @login_required
 @require_perm("masters.manage")
 def update_lead_source(source_id):
-    s = LeadSource.query.get_or_404(source_id)
+    s = db.session.get(LeadSource, source_id) or abort(404)
     s.name = (request.form.get("name") or "").strip()
     s.sort_order = int(request.form.get("sort_order") or 0)
     s.is_active = True if request.form.get("is_active") == "1" else False
@@ -563,12 +708,17 @@ def activity_type_master():
             flash("Activity type name is required.", "danger")
             return redirect(url_for("admin.activity_type_master"))
 
-        if ActivityType.query.filter_by(name=name).first():
+        # activity_types.name is UNIQUE: let the DB reject duplicates
+        db.session.add(ActivityType(name=name, icon=icon, sort_order=sort_order, is_active=True))
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_duplicate_key(e):
+                raise
             flash("Activity type already exists.", "warning")
             return redirect(url_for("admin.activity_type_master"))
-
-        db.session.add(ActivityType(name=name, icon=icon, sort_order=sort_order, is_active=True))
-        db.session.commit()
+        _invalidate_activity_types()
         flash("Activity type added ✅", "success")
         return redirect(url_for("admin.activity_type_master"))
 
@@ -580,7 +730,7 @@ def activity_type_master():
 @login_required
 @require_perm("masters.manage")
 def update_activity_type(type_id):
-    t = ActivityType.query.get_or_404(type_id)
+    t = db.session.get(ActivityType, type_id) or abort(404)
     t.name = (request.form.get("name") or "").strip()
     t.icon = (request.form.get("icon") or "telephone").strip()
     t.sort_order = int(request.form.get("sort_order") or 0)
@@ -591,6 +741,7 @@ def update_activity_type(type_id):
         return redirect(url_for("admin.activity_type_master"))
 
     db.session.commit()
+    _invalidate_activity_types()
     flash("Activity type updated ✅", "success")
     return redirect(url_for("admin.activity_type_master"))
 
@@ -643,15 +794,19 @@ def cluster_master():
             flash("Cluster head must have Team Role BD or AM.", "warning")
 
         if action == "create":
-            # prevent duplicate cluster name
-            existing = Cluster.query.filter(db.func.lower(Cluster.name) == name.lower()).first()
-            if existing:
-                flash("Cluster with this name already exists.", "danger")
-                return redirect(url_for("admin.cluster_master"))
-
+            # clusters.name is UNIQUE (case-insensitive under the MySQL collation):
+            # the DB rejects duplicates, no pre-check SELECT
             c = Cluster(name=name, head_user_id=head_user_id, is_active=is_active)
             db.session.add(c)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError as e:
+                db.session.rollback()
+                if not is_duplicate_key(e):
+                    raise
+                flash("Cluster with this name already exists.", "danger")
+                return redirect(url_for("admin.cluster_master"))
+            invalidate_cluster_options()
             flash("Cluster created successfully.", "success")
             return redirect(url_for("admin.cluster_master"))
 
@@ -666,19 +821,19 @@ def cluster_master():
                 flash("Cluster not found.", "danger")
                 return redirect(url_for("admin.cluster_master"))
 
-            # prevent duplicate name to another record
-            dup = (Cluster.query
-                   .filter(db.func.lower(Cluster.name) == name.lower())
-                   .filter(Cluster.id != c.id)
-                   .first())
-            if dup:
-                flash("Another cluster with this name already exists.", "danger")
-                return redirect(url_for("admin.cluster_master"))
-
             c.name = name
             c.head_user_id = head_user_id
             c.is_active = is_active
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError as e:
+                # prevent duplicate name to another record
+                db.session.rollback()
+                if not is_duplicate_key(e):
+                    raise
+                flash("Another cluster with this name already exists.", "danger")
+                return redirect(url_for("admin.cluster_master"))
+            invalidate_cluster_options()
             flash("Cluster updated successfully.", "success")
             return redirect(url_for("admin.cluster_master"))
 
@@ -696,6 +851,7 @@ def cluster_master():
             # soft delete recommended
             c.is_active = False
             db.session.commit()
+            invalidate_cluster_options()
             flash("Cluster disabled (soft deleted).", "success")
             return redirect(url_for("admin.cluster_master"))
 
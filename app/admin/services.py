@@ -1,10 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 from flask_login import login_required
-from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 
 from .. import db
 from ..audit import log_audit
-from ..utils import require_perm
+from ..utils import require_perm, is_duplicate_key
 from ..models import LeadService, Lead
 
 
@@ -45,14 +45,17 @@ def lead_services_master():
                 flash("Service name is required.", "danger")
                 return redirect(url_for("admin_services.lead_services_master"))
 
-            exists = LeadService.query.filter(func.lower(LeadService.name) == name.lower()).first()
-            if exists:
-                flash("Service already exists.", "warning")
-                return redirect(url_for("admin_services.lead_services_master"))
-
+            # lead_services.name is UNIQUE: let the DB reject duplicates
             obj = LeadService(name=name, sort_order=sort_order, is_active=is_active)
             db.session.add(obj)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError as e:
+                db.session.rollback()
+                if not is_duplicate_key(e):
+                    raise
+                flash("Service already exists.", "warning")
+                return redirect(url_for("admin_services.lead_services_master"))
 
             log_audit("LeadService", obj.id, "CREATE")
             flash("Service added ✅", "success")
@@ -97,10 +100,10 @@ def lead_services_master():
 @login_required
 @require_perm("lead_services.manage")
 def delete_lead_service(service_id):
-    obj = LeadService.query.get_or_404(service_id)
+    obj = db.session.get(LeadService, service_id) or abort(404)
 
     # block delete if used
-    in_use = Lead.query.filter(Lead.service_id == obj.id).count()
+    in_use = db.session.query(Lead.query.filter(Lead.service_id == obj.id).exists()).scalar()
     if in_use:
         flash("Cannot delete. This service is already used in Leads.", "danger")
         return redirect(url_for("admin_services.lead_services_master"))
@@ -1,10 +1,15 @@
+import re
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from collections import namedtuple
+from itertools import chain
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, g
 from flask_login import login_required
-from werkzeug.security import generate_password_hash
-from decimal import Decimal
+from sqlalchemy import event
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session, joinedload, selectinload
+from decimal import Decimal, InvalidOperation
 from .. import db
-from ..utils import require_perm
+from ..utils import require_perm, TTLCache
 from ..models import (
     User, Role, EmployeeProfile, Designation,
     QuoteApproval, ApprovalRuleStep,
@@ -13,11 +18,109 @@ from ..models import (
 
 user_master_bp = Blueprint("user_master", __name__, template_folder="../templates")
 
+# tenant slug -> dropdown rows for the user forms; plain tuples, dropped on any write to their tables
+RoleOption = namedtuple("RoleOption", "id name")
+DesignationOption = namedtuple("DesignationOption", "id name")
+ManagerOption = namedtuple("ManagerOption", "id name email")
+BranchOption = namedtuple("BranchOption", "id branch_name company_name")
+_FORM_OPTIONS_CACHE = TTLCache(ttl=300)
+_FORM_OPTION_MODELS = (Role, Designation, User, CompanyBranch, Company)
+
+_USERS_PER_PAGE = 50
+
+# InnoDB's default FULLTEXT stopword list; as "+word*" terms they would never match
+_FULLTEXT_STOPWORDS = frozenset("""
+    a about an are as at be by com de en for from how i in is it la of on or
+    that the this to was what when where who will with und www
+""".split())
+
+# InnoDB does not index words shorter than innodb_ft_min_token_size (default 3)
+_FULLTEXT_MIN_TOKEN = 3
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_form_options(session, flush_context):
+    if any(isinstance(obj, _FORM_OPTION_MODELS)
+           for obj in chain(session.new, session.dirty, session.deleted)):
+        _FORM_OPTIONS_CACHE.clear()
+
 
 def _clean(s):
     return (s or "").strip()
 
 
+def _to_int(form, key):
+    """Form field as an id: int for a plain digit string, else None."""
+    v = _clean(form.get(key))
+    return int(v) if v.isdigit() else None
+
+
+def _to_decimal(form, key, default="0"):
+    """Form field as Decimal; blank or malformed input gives the default."""
+    try:
+        return Decimal(_clean(form.get(key)) or default)
+    except InvalidOperation:
+        return Decimal(default)
+
+
+def _user_fulltext_filter(q):
+    """
+    Name/email search on the FULLTEXT (name, email) index: every word becomes a
+    required prefix term. None on another dialect, when a word is too short for
+    the index, or when only stopwords are left; the caller then uses the LIKE scan.
+    """
+    if db.session.get_bind(mapper=User.__mapper__).dialect.name != "mysql":
+        return None
+    words = [w for w in re.findall(r"\w+", q) if w.lower() not in _FULLTEXT_STOPWORDS]
+    if not words or any(len(w) < _FULLTEXT_MIN_TOKEN for w in words):
+        return None
+    return match(User.name, User.email, against=" ".join(f"+{w}*" for w in words)).in_boolean_mode()
+
+
+def _user_like_filter(q):
+    like = f"%{q}%"
+    return (User.name.like(like)) | (User.email.like(like))
+
+
+def _users_page(qs, page):
+    # one page of users; every row renders role, profile (code/designation/team role) and branch -> company
+    return (qs
+            .options(
+                joinedload(User.role),
+                selectinload(User.profile).joinedload(EmployeeProfile.designation),
+                joinedload(User.company_branch).joinedload(CompanyBranch.company),
+            )
+            .order_by(User.id.desc())
+            .paginate(page=page, per_page=_USERS_PER_PAGE, error_out=False))
+
+
+def _form_options():
+    """Roles, designations, managers and branches for the user master dropdowns, cached per tenant."""
+    slug = getattr(g, "tenant_slug", None)
+    opts = _FORM_OPTIONS_CACHE.get(slug)
+    if opts is None:
+        roles = db.session.query(Role.id, Role.name).order_by(Role.name.asc())
+        designations = (db.session.query(Designation.id, Designation.name)
+                        .filter_by(is_active=True)
+                        .order_by(Designation.name.asc()))
+        managers = (db.session.query(User.id, User.name, User.email)
+                    .filter_by(is_active=True)
+                    .order_by(User.name.asc()))
+        # branch dropdown data (show company + branch name)
+        branches = (db.session.query(CompanyBranch.id, CompanyBranch.branch_name, Company.name)
+                    .join(CompanyBranch.company)
+                    .filter(CompanyBranch.is_active == True)
+                    .filter(Company.is_active == True)
+                    .order_by(Company.name.asc(), CompanyBranch.branch_name.asc()))
+        opts = _FORM_OPTIONS_CACHE.set(slug, {
+            "roles": tuple(RoleOption(*r) for r in roles),
+            "designations": tuple(DesignationOption(*r) for r in designations),
+            "managers": tuple(ManagerOption(*r) for r in managers),
+            "branches": tuple(BranchOption(*r) for r in branches),
+        })
+    return opts
+
+
 @user_master_bp.route("/users", methods=["GET", "POST"])
 @login_required
 @require_perm("users.manage")
@@ -27,28 +130,24 @@ def users_master():
         action = request.form.get("action")
 
         if action == "create":
-            name = _clean(request.form.get("name"))
-            email = _clean(request.form.get("email")).lower()
-            role_id = request.form.get("role_id")
-            auth_provider = _clean(request.form.get("auth_provider")) or "LOCAL"
-            password = request.form.get("password") or ""
-
-            employee_code = _clean(request.form.get("employee_code"))
-            designation_id = request.form.get("designation_id")
-            department = _clean(request.form.get("department"))
-            manager_id = request.form.get("reporting_manager_user_id")
-            monthly_ctc = request.form.get("monthly_ctc") or "0"
-            team_role = _clean(request.form.get("team_role")) or None
-            prof.team_role = team_role
-
-            # ✅ NEW: Company Branch
-            cb = _clean(request.form.get("company_branch_id"))
-            company_branch_id = int(cb) if cb.isdigit() else None
+            f = request.form.to_dict(flat=True)  # one pass over the MultiDict
+            name = _clean(f.get("name"))
+            email = _clean(f.get("email")).lower()
+            auth_provider = _clean(f.get("auth_provider")) or "LOCAL"
+            password = f.get("password") or ""
+
+            employee_code = _clean(f.get("employee_code"))
+            department = _clean(f.get("department"))
+            team_role = _clean(f.get("team_role")) or None
 
             if not name or not email:
                 flash("Name and Email are required.", "danger")
                 return redirect(url_for("user_master.users_master"))
 
+            if auth_provider == "LOCAL" and not password:
+                flash("Password is required for LOCAL users.", "danger")
+                return redirect(url_for("user_master.users_master"))
+
             if User.query.filter_by(email=email).first():
                 flash("Email already exists.", "danger")
                 return redirect(url_for("user_master.users_master"))
@@ -56,18 +155,16 @@ def users_master():
             u = User(
                 name=name,
                 email=email,
-                role_id=int(role_id) if (role_id and role_id.isdigit()) else None,
+                role_id=_to_int(f, "role_id"),
                 auth_provider=auth_provider,
                 is_active=True,
-                company_branch_id=company_branch_id,  # ✅ save
-                monthly_ctc=Decimal(str(monthly_ctc).strip() or "0"),
+                company_branch_id=_to_int(f, "company_branch_id"),  # ✅ save
+                monthly_ctc=_to_decimal(f, "monthly_ctc"),
             )
 
+            # hash only once every check has passed (it is the slow part of a create)
             if auth_provider == "LOCAL":
-                if not password:
-                    flash("Password is required for LOCAL users.", "danger")
-                    return redirect(url_for("user_master.users_master"))
-                u.password_hash = generate_password_hash(password)
+                u.set_password(password)
             else:
                 u.password_hash = None
 
@@ -77,9 +174,9 @@ def users_master():
             prof = EmployeeProfile(
                 user_id=u.id,
                 employee_code=employee_code or None,
-                designation_id=int(designation_id) if (designation_id and designation_id.isdigit()) else None,
+                designation_id=_to_int(f, "designation_id"),
                 department=department or None,
-                reporting_manager_user_id=int(manager_id) if (manager_id and manager_id.isdigit()) else None,
+                reporting_manager_user_id=_to_int(f, "reporting_manager_user_id"),
                 team_role=team_role,
                 source="LOCAL" if auth_provider == "LOCAL" else "HRMS"
             )
@@ -96,68 +193,53 @@ def users_master():
 
     qs = User.query
 
-    if q:
-        like = f"%{q}%"
-        qs = qs.filter((User.name.like(like)) | (User.email.like(like)))
-
     if provider:
         qs = qs.filter(User.auth_provider == provider)
 
     if role.isdigit():
         qs = qs.filter(User.role_id == int(role))
 
-    users = qs.order_by(User.id.desc()).all()
-
-    roles = Role.query.order_by(Role.name.asc()).all()
-    designations = Designation.query.filter_by(is_active=True).order_by(Designation.name.asc()).all()
-    managers = User.query.filter_by(is_active=True).order_by(User.name.asc()).all()
-
-    # ✅ NEW: branch dropdown data (show company + branch name)
-    branches = (CompanyBranch.query
-                .join(Company)
-                .filter(CompanyBranch.is_active == True)
-                .filter(Company.is_active == True)
-                .order_by(Company.name.asc(), CompanyBranch.branch_name.asc())
-                .all())
+    page = request.args.get("page", 1, type=int)
+    fulltext = _user_fulltext_filter(q) if q else None
+    if fulltext is not None:
+        pagination = _users_page(qs.filter(fulltext), page)
+        # word-prefix search found nothing: keep the old substring match (e.g. "mith" -> "Smith")
+        if pagination.total == 0:
+            pagination = _users_page(qs.filter(_user_like_filter(q)), page)
+    elif q:
+        pagination = _users_page(qs.filter(_user_like_filter(q)), page)
+    else:
+        pagination = _users_page(qs, page)
 
     return render_template(
         "admin/users_master.html",
-        users=users,
-        roles=roles,
-        designations=designations,
-        managers=managers,
-        branches=branches,  # ✅ pass to template
+        users=pagination.items,
+        pagination=pagination,
+        **_form_options(),
         q=q,
         provider=provider,
         role_filter=role
     )
 
 
-from decimal import Decimal
-
 @user_master_bp.route("/users/<int:user_id>/update", methods=["POST"])
 @login_required
 @require_perm("users.manage")
 def update_user(user_id):
-    u = User.query.get_or_404(user_id)
+    u = db.session.get(User, user_id) or abort(404)
+    f = request.form.to_dict(flat=True)  # one pass over the MultiDict
 
     can_edit_identity = (u.auth_provider == "LOCAL")
 
-    name = _clean(request.form.get("name"))
-    email = _clean(request.form.get("email")).lower()
-    role_id = request.form.get("role_id")
-    is_active = True if request.form.get("is_active") == "1" else False
+    name = _clean(f.get("name"))
+    email = _clean(f.get("email")).lower()
+    is_active = True if f.get("is_active") == "1" else False
 
     # ✅ Company Branch update
-    cb = _clean(request.form.get("company_branch_id"))
-    u.company_branch_id = int(cb) if cb.isdigit() else None
+    u.company_branch_id = _to_int(f, "company_branch_id")
 
     # ✅ Monthly CTC update (always editable by Admin/HR)
-    monthly_ctc = _clean(request.form.get("monthly_ctc")) or "0"
-    try:
-        u.monthly_ctc = Decimal(monthly_ctc)
-    except Exception:
-        u.monthly_ctc = Decimal("0")
+    u.monthly_ctc = _to_decimal(f, "monthly_ctc")
 
     if can_edit_identity:
         if not name or not email:
@@ -171,24 +253,31 @@ def update_user(user_id):
         u.name = name
         u.email = email
 
-    u.role_id = int(role_id) if (role_id and role_id.isdigit()) else None
+    u.role_id = _to_int(f, "role_id")
 
     # ---- deactivation guard ----
     if u.is_active and (is_active is False):
-        pending_count = (QuoteApproval.query
+        # both checks as EXISTS of one SELECT: a single round trip, each stops at the first hit
+        has_pending_q = (QuoteApproval.query
             .filter(QuoteApproval.approver_user_id == u.id)
             .filter(QuoteApproval.status.in_(["PENDING", "WAITING"]))
-            .count()
+            .exists()
         )
-        step_count = (ApprovalRuleStep.query
-            .filter_by(is_active=True, approver_user_id=u.id)
-            .count()
+        has_step_q = (ApprovalRuleStep.query
+            .filter(ApprovalRuleStep.is_active.is_(True))
+            .filter(ApprovalRuleStep.approver_user_id == u.id)
+            .exists()
         )
-        if pending_count > 0 or step_count > 0:
+        has_pending, has_step = db.session.query(has_pending_q, has_step_q).one()
+        if has_pending or has_step:
+            blockers = []
+            if has_pending:
+                blockers.append("pending quote approvals")
+            if has_step:
+                blockers.append("active approval-rule steps")
             flash(
                 f"Cannot deactivate user. "
-                f"Active approvals assigned: {pending_count}, "
-                f"active approval-rule steps: {step_count}. "
+                f"Still assigned: {' and '.join(blockers)}. "
                 f"Reassign or disable steps first.",
                 "danger"
             )
@@ -201,18 +290,16 @@ def update_user(user_id):
     if not prof:
         prof = EmployeeProfile(user_id=u.id)
 
-    prof.employee_code = _clean(request.form.get("employee_code")) or None
+    prof.employee_code = _clean(f.get("employee_code")) or None
 
-    desig = request.form.get("designation_id")
-    prof.designation_id = int(desig) if (desig and desig.isdigit()) else None
+    prof.designation_id = _to_int(f, "designation_id")
 
-    prof.department = _clean(request.form.get("department")) or None
+    prof.department = _clean(f.get("department")) or None
 
-    mgr = request.form.get("reporting_manager_user_id")
-    prof.reporting_manager_user_id = int(mgr) if (mgr and mgr.isdigit()) else None
+    prof.reporting_manager_user_id = _to_int(f, "reporting_manager_user_id")
 
     # ✅ Team role (BD/AM)
-    prof.team_role = _clean(request.form.get("team_role")) or None
+    prof.team_role = _clean(f.get("team_role")) or None
 
     db.session.add(prof)
     db.session.commit()
@@ -224,7 +311,7 @@ def update_user(user_id):
 @login_required
 @require_perm("users.manage")
 def reset_password(user_id):
-    u = User.query.get_or_404(user_id)
+    u = db.session.get(User, user_id) or abort(404)
 
     if u.auth_provider != "LOCAL":
         flash("Password is not managed for HRMS/SSO users.", "warning")
@@ -235,7 +322,7 @@ def reset_password(user_id):
         flash("New password is required.", "danger")
         return redirect(url_for("user_master.users_master"))
 
-    u.password_hash = generate_password_hash(new_password)
+    u.set_password(new_password)
     db.session.commit()
 
     flash("Password reset ✅", "success")
@@ -1,4 +1,5 @@
 from sqlalchemy import text
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from . import db
 from .models import (
     User, Role, Permission,
@@ -9,6 +10,20 @@ from .models import (
 )
 
 
+def _insert_missing(model, rows):
+    """
+    One multi-row INSERT that skips rows whose unique key is already present
+    (INSERT IGNORE on MySQL, ON CONFLICT DO NOTHING elsewhere): no read-then-write race
+    between concurrent seeds, the unique index does the dedup server-side.
+    """
+    dialect = db.session.get_bind(mapper=model.__mapper__).dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(model).prefix_with("IGNORE")
+    else:
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(model).on_conflict_do_nothing()
+    db.session.execute(stmt.values(rows))
+
+
 # =========================================================
 # Seed All
 # =========================================================
@@ -85,10 +100,11 @@ def seed_all():
         "projects.cost.add",
     ]
 
-    # Seed permissions
-    for code in perm_codes:
-        if not Permission.query.filter_by(code=code).first():
-            db.session.add(Permission(code=code, description=code))
+    # Seed permissions (one INSERT; existing codes are skipped)
+    _insert_missing(Permission, [
+        {"code": code, "description": code}
+        for code in perm_codes
+    ])
 
     # ---- Masters ----
     defaults_statuses = [
@@ -97,9 +113,10 @@ def seed_all():
         ("Qualified", "success", 3),
         ("Lost", "secondary", 90),
     ]
-    for name, color, order in defaults_statuses:
-        if not LeadStatus.query.filter_by(name=name).first():
-            db.session.add(LeadStatus(name=name, color=color, sort_order=order, is_active=True))
+    _insert_missing(LeadStatus, [
+        {"name": name, "color": color, "sort_order": order, "is_active": True}
+        for name, color, order in defaults_statuses
+    ])
 
     defaults_sources = [
         ("Website", 1),
@@ -107,9 +124,10 @@ def seed_all():
         ("Cold Call", 3),
         ("Walk-in", 4),
     ]
-    for name, order in defaults_sources:
-        if not LeadSource.query.filter_by(name=name).first():
-            db.session.add(LeadSource(name=name, sort_order=order, is_active=True))
+    _insert_missing(LeadSource, [
+        {"name": name, "sort_order": order, "is_active": True}
+        for name, order in defaults_sources
+    ])
 
     default_industries = [
         ("Information Technology", 1),
@@ -133,9 +151,10 @@ def seed_all():
         ("FMCG", 19),
         ("Government", 20),
     ]
-    for name, order in default_industries:
-        if not Industry.query.filter_by(name=name).first():
-            db.session.add(Industry(name=name, sort_order=order, is_active=True))
+    _insert_missing(Industry, [
+        {"name": name, "sort_order": order, "is_active": True}
+        for name, order in default_industries
+    ])
 
     
 
@@ -145,9 +164,10 @@ def seed_all():
         ("EUR", "Euro", "€", False, 3),
         ("GBP", "British Pound", "£", False, 4),
     ]
-    for code, name, sym, gst, order in default_currencies:
-        if not Currency.query.filter_by(code=code).first():
-            db.session.add(Currency(code=code, name=name, symbol=sym, gst_applicable=gst, sort_order=order, is_active=True))
+    _insert_missing(Currency, [
+        {"code": code, "name": name, "symbol": sym, "gst_applicable": gst, "sort_order": order, "is_active": True}
+        for code, name, sym, gst, order in default_currencies
+    ])
             
     default_activity_types = [
         ("Call", "telephone", 1),
@@ -156,9 +176,10 @@ def seed_all():
         ("WhatsApp", "chat-dots", 4),
         ("Site Visit", "geo-alt", 5),
     ]
-    for name, icon, order in default_activity_types:
-        if not ActivityType.query.filter_by(name=name).first():
-            db.session.add(ActivityType(name=name, icon=icon, sort_order=order, is_active=True))
+    _insert_missing(ActivityType, [
+        {"name": name, "icon": icon, "sort_order": order, "is_active": True}
+        for name, icon, order in default_activity_types
+    ])
 
     default_stages = [
         ("Prospect", "secondary", 10, 1),
@@ -168,9 +189,10 @@ def seed_all():
         ("Won", "success", 100, 90),
         ("Lost", "dark", 0, 99),
     ]
-    for name, color, prob, order in default_stages:
-        if not PipelineStage.query.filter_by(name=name).first():
-            db.session.add(PipelineStage(name=name, color=color, probability=prob, sort_order=order, is_active=True))
+    _insert_missing(PipelineStage, [
+        {"name": name, "color": color, "probability": prob, "sort_order": order, "is_active": True}
+        for name, color, prob, order in default_stages
+    ])
 
     default_quote_statuses = [
         ("Draft", 1),
@@ -180,9 +202,10 @@ def seed_all():
         ("Rejected", 5),
         ("Sent", 6),
     ]
-    for name, order in default_quote_statuses:
-        if not QuoteStatus.query.filter_by(name=name).first():
-            db.session.add(QuoteStatus(name=name, sort_order=order, is_active=True))
+    _insert_missing(QuoteStatus, [
+        {"name": name, "sort_order": order, "is_active": True}
+        for name, order in default_quote_statuses
+    ])
 
     # ---- Approval Rules + Steps ----
     default_rules = [("Default Approval (>= 1)", 1, None, "Admin", 1)]
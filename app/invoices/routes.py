@@ -5,7 +5,8 @@ from sqlalchemy import or_, func
 from datetime import datetime, timedelta
 from app import db
 from app.utils import require_perm
-from app.models import ProformaInvoice, Invoice, QuoteItem, Quote, Opportunity, EmployeeProfile, PipelineStage, OpportunityStageHistory
+from app.services.team import team_user_ids
+from app.models import ProformaInvoice, Invoice, QuoteItem, Quote, Opportunity, PipelineStage, OpportunityStageHistory
 
 
 invoices_bp = Blueprint("invoices", __name__, url_prefix="/invoices", template_folder="../templates")
@@ -15,22 +16,7 @@ invoices_bp = Blueprint("invoices", __name__, url_prefix="/invoices", template_f
 # Visibility helpers (same as quotes/proforma)
 # -------------------------
 def _team_user_ids(manager_user_id: int, include_self: bool = True):
-    seen = set([manager_user_id]) if include_self else set()
-    queue = [manager_user_id]
-
-    while queue:
-        mid = queue.pop(0)
-        rows = (
-            db.session.query(EmployeeProfile.user_id)
-            .filter(EmployeeProfile.reporting_manager_user_id == mid)
-            .all()
-        )
-        for (uid,) in rows:
-            if uid not in seen:
-                seen.add(uid)
-                queue.append(uid)
-
-    return list(seen)
+    return team_user_ids(manager_user_id, include_self=include_self)
 
 def _get_won_stage_id():
     # Preferred: stage name = "Won"
@@ -207,7 +193,7 @@ def view_invoice(invoice_id):
         return redirect(url_for("invoices.view_invoice", invoice_id=inv.id))
 
     collected = inv.collected_amount()
-    remaining = inv.remaining_amount()
+    remaining = inv.remaining_amount(collected)
     return render_template("invoices/invoice_view.html", invoice=inv, collected=collected, remaining=remaining)
 
 
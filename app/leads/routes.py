@@ -6,10 +6,11 @@ from datetime import datetime, timedelta
 from ..audit import log_audit
 from .. import db
 from ..utils import require_perm
+from ..services.team import team_user_ids
 from ..models import (
     Lead, LeadStatus, LeadSource, User,
     LeadActivity, ActivityType,
-    Client, ClientBranch, EmployeeProfile, Industry, LeadService,
+    Client, ClientBranch, Industry, LeadService,
 )
 
 from werkzeug.utils import secure_filename
@@ -23,21 +24,7 @@ leads_bp = Blueprint("leads", __name__, template_folder="../templates")
 # -------------------------
 def _team_user_ids(manager_user_id: int):
     """Return direct + nested reportees user_ids (recursive)."""
-    seen = set()
-    stack = [manager_user_id]
-
-    while stack:
-        mid = stack.pop()
-        rows = (EmployeeProfile.query
-                .filter(EmployeeProfile.reporting_manager_user_id == mid)
-                .with_entities(EmployeeProfile.user_id)
-                .all())
-        child_ids = [r[0] for r in rows if r[0] is not None and r[0] not in seen]
-        for cid in child_ids:
-            seen.add(cid)
-            stack.append(cid)
-
-    return list(seen)
+    return team_user_ids(manager_user_id, include_self=False)
 
 
 def _allowed_lead_owner_ids():
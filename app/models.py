@@ -1,11 +1,18 @@
 from datetime import date, datetime
 from decimal import Decimal
+from flask import current_app
 from flask_login import UserMixin
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from . import db, login_manager
 
+
+def _as_decimal(v):
+    # Numeric columns / SUM() over them are already Decimal; only re-parse other types
+    return v if isinstance(v, Decimal) else Decimal(str(v))
+
 # -------------------------
 # RBAC
 # -------------------------
@@ -45,11 +52,16 @@ class Menu(db.Model):
     submenus = db.relationship(
         "SubMenu",
         backref="menu",
-        lazy="dynamic",
+        lazy="select",
         cascade="all, delete-orphan",
         order_by="SubMenu.sort_order.asc()",
     )
 
+    __table_args__ = (
+        # sidebar + menu management: WHERE is_active ORDER BY sort_order
+        db.Index("ix_menu_active_sort", "is_active", "sort_order"),
+    )
+
 class SubMenu(db.Model):
     __tablename__ = "submenus"
     id = db.Column(db.Integer, primary_key=True)
@@ -68,6 +80,10 @@ class SubMenu(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("ix_submenu_menu_active_sort", "menu_id", "is_active", "sort_order"),
+    )
+
 
 # -------------------------
 # User + HR Profile (supports LOCAL + HRMS/SSO)
@@ -101,6 +117,11 @@ class User(db.Model, UserMixin):
     
     monthly_ctc = db.Column(db.Numeric(12, 2), nullable=True, default=0, index=True)
 
+    __table_args__ = (
+        # user master search: MATCH(name, email) AGAINST (... IN BOOLEAN MODE) on MySQL
+        db.Index("ix_users_search", "name", "email", mysql_prefix="FULLTEXT"),
+    )
+
     # 1–1 profile
     profile = db.relationship(
         "EmployeeProfile",
@@ -113,7 +134,7 @@ class User(db.Model, UserMixin):
     def set_password(self, password: str):
         self.password_hash = generate_password_hash(
             password,
-            method="pbkdf2:sha256",
+            method=current_app.config.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256"),
             salt_length=16
         )
 
@@ -122,15 +143,25 @@ class User(db.Model, UserMixin):
             return False
         return check_password_hash(self.password_hash, password)
 
+    @property
+    def perm_codes(self):
+        # memoized on the instance; the user loader builds a fresh User per request
+        codes = self.__dict__.get("_perm_codes")
+        if codes is None:
+            codes = frozenset(p.code for p in (self.role.permissions or ())) if self.role else frozenset()
+            self._perm_codes = codes
+        return codes
+
     def has_perm(self, code: str) -> bool:
-        if not self.role:
-            return False
-        return any(p.code == code for p in self.role.permissions)
+        return code in self.perm_codes
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # role + permissions in the same round trip; every page checks perms
+    return (User.query
+            .options(joinedload(User.role).joinedload(Role.permissions))
+            .get(int(user_id)))
 
 
 class Designation(db.Model):
@@ -167,7 +198,8 @@ class EmployeeProfile(db.Model):
 
     department = db.Column(db.String(120), nullable=True)
 
-    reporting_manager_user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    # indexed: the employee_closure rebuild walks this column
+    reporting_manager_user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True, index=True)
     reporting_manager = db.relationship(
         "User",
         foreign_keys=[reporting_manager_user_id],
@@ -181,6 +213,18 @@ class EmployeeProfile(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class EmployeeClosure(db.Model):
+    """
+    Every (manager, report) pair of the reporting tree at any depth, derived from
+    EmployeeProfile.reporting_manager_user_id and kept in step by services.team.
+    The (ancestor_id, descendant_id) primary key doubles as the ancestor_id index.
+    """
+    __tablename__ = "employee_closure"
+    ancestor_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    descendant_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    depth = db.Column(db.Integer, nullable=False)
+
+
 # -------------------------
 # Clients (Customer Master)
 # -------------------------
@@ -371,6 +415,13 @@ class Lead(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # dashboards: owner_id IN (...) ORDER BY created_at DESC LIMIT n
+        db.Index("ix_lead_owner_created", "owner_id", "created_at"),
+        # dashboards: per-status lead counts, answered from the index alone
+        db.Index("ix_lead_owner_status", "owner_id", "status_id"),
+    )
+
 
 class ActivityType(db.Model):
     __tablename__ = "activity_types"
@@ -406,6 +457,11 @@ class LeadActivity(db.Model):
     )
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # dashboard follow-ups: ordered by next_follow_up_at, lead_id carried for the join
+        db.Index("ix_lead_activity_follow_up", "next_follow_up_at", "lead_id"),
+    )
+
 
 class AuditLog(db.Model):
     __tablename__ = "audit_logs"
@@ -462,6 +518,7 @@ class Opportunity(db.Model):
     stage_id = db.Column(db.Integer, db.ForeignKey("pipeline_stages.id"))
     stage = db.relationship("PipelineStage")
 
+    # indexed through the owner_id-leading composites below
     owner_id = db.Column(db.Integer, db.ForeignKey("users.id"))
     owner = db.relationship("User")
 
@@ -473,6 +530,12 @@ class Opportunity(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # dashboards: recent opportunities / closing soon per owner set
+        db.Index("ix_opp_owner_created", "owner_id", "created_at"),
+        db.Index("ix_opp_owner_close_date", "owner_id", "expected_close_date"),
+    )
+
 
 class OpportunityStageHistory(db.Model):
     __tablename__ = "opportunity_stage_history"
@@ -522,6 +585,11 @@ class Quote(db.Model):
         backref=db.backref("quotes_created", lazy="dynamic")
     )
 
+    __table_args__ = (
+        # dashboards: quotes per creator grouped by status
+        db.Index("ix_quote_creator_status", "created_by_id", "status_id"),
+    )
+
     # ✅ NEW: link quote to client once converted/selected
     client_id = db.Column(db.Integer, db.ForeignKey("clients.id"), nullable=True, index=True)
     client = db.relationship("Client", foreign_keys=[client_id])
@@ -767,6 +835,13 @@ class PaymentCollection(db.Model):
     created_by = db.relationship("User", foreign_keys=[created_by_id])
     verified_by = db.relationship("User", foreign_keys=[verified_by_id])
 
+    __table_args__ = (
+        # dashboards: recent payments / totals per creator
+        db.Index("ix_payment_creator_created", "created_by_id", "created_at"),
+        # finance queue badge: status = 'Pending'
+        db.Index("ix_payment_status", "status"),
+    )
+
 class ClientDocument(db.Model):
     __tablename__ = "client_documents"  # ✅ recommended plural (use your existing name if already migrated)
 
@@ -940,14 +1015,22 @@ class Invoice(db.Model):
     project_id = db.Column(db.Integer, db.ForeignKey("projects.id"), nullable=True, index=True)
     project = db.relationship("Project", foreign_keys=[project_id])
 
+    __table_args__ = (
+        # reports: invoice_date BETWEEN .. AND status != 'Cancelled'
+        db.Index("ix_invoice_date_status", "invoice_date", "status"),
+    )
+
     def collected_amount(self):
         return (db.session.query(func.coalesce(func.sum(InvoicePayment.amount), 0))
                 .filter(InvoicePayment.invoice_id == self.id)
                 .filter(InvoicePayment.status != "Rejected")
                 .scalar()) or 0
 
-    def remaining_amount(self):
-        return Decimal(str(self.total_amount)) - Decimal(str(self.collected_amount()))
+    def remaining_amount(self, collected=None):
+        """Pass collected when the caller already has it, to skip the second SUM query."""
+        if collected is None:
+            collected = self.collected_amount()
+        return _as_decimal(self.total_amount) - _as_decimal(collected)
     
 
 class InvoicePayment(db.Model):
@@ -1015,6 +1098,11 @@ class Project(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        # margin report / my-dashboard: created_at range + account manager
+        db.Index("ix_project_created_am", "created_at", "account_manager_user_id"),
+    )
+
 class ProjectCost(db.Model):
     __tablename__ = "project_costs"
     id = db.Column(db.Integer, primary_key=True)
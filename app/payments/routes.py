@@ -119,7 +119,7 @@ def invoice_payments(invoice_id):
                 .all())
 
     collected = invoice.collected_amount()
-    remaining = invoice.remaining_amount()
+    remaining = invoice.remaining_amount(collected)
 
     return render_template(
         "payments/invoice_payments.html",
@@ -191,9 +191,22 @@ def finance_payment_queue():
 
     pending = qs.order_by(InvoicePayment.created_at.desc()).all()
 
+    # collected per listed invoice in one GROUP BY (same rule as Invoice.collected_amount())
+    invoice_ids = {p.invoice_id for p in pending if p.invoice_id}
+    collected_map = {}
+    if invoice_ids:
+        collected_map = dict(
+            db.session.query(InvoicePayment.invoice_id, func.sum(InvoicePayment.amount))
+            .filter(InvoicePayment.invoice_id.in_(invoice_ids))
+            .filter(InvoicePayment.status != "Rejected")
+            .group_by(InvoicePayment.invoice_id)
+            .all()
+        )
+
     return render_template(
         "payments/finance_payment_queue.html",
         pending=pending,
+        collected_map=collected_map,
         q=q,
         status=status,
         date_from=date_from,
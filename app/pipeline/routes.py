@@ -1,10 +1,12 @@
 from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload
 
 from .. import db
 from ..utils import require_perm
-from ..models import PipelineStage, Opportunity, OpportunityStageHistory, Lead, EmployeeProfile
+from ..services.team import team_user_ids
+from ..models import PipelineStage, Opportunity, OpportunityStageHistory, Lead
 
 pipeline_bp = Blueprint("pipeline", __name__, template_folder="../templates")
 
@@ -16,19 +18,7 @@ def _opp_code_next():
 
 
 def _team_user_ids(manager_user_id: int, include_self: bool = True):
-    seen = set([manager_user_id]) if include_self else set()
-    stack = [manager_user_id]
-    while stack:
-        mid = stack.pop()
-        rows = (EmployeeProfile.query
-                .filter(EmployeeProfile.reporting_manager_user_id == mid)
-                .with_entities(EmployeeProfile.user_id)
-                .all())
-        for (uid,) in rows:
-            if uid is not None and uid not in seen:
-                seen.add(uid)
-                stack.append(uid)
-    return list(seen)
+    return team_user_ids(manager_user_id, include_self=include_self)
 
 def _allowed_owner_ids():
     if current_user.has_perm("pipeline.view_all"):
@@ -49,7 +39,10 @@ def _require_opp_access(o: Opportunity):
 def board():
     stages = PipelineStage.query.filter_by(is_active=True).order_by(PipelineStage.sort_order.asc()).all()
 
-    qs = Opportunity.query.order_by(Opportunity.updated_at.desc())
+    # owner + lead cards: one IN query each instead of a lazy load per card
+    qs = (Opportunity.query
+          .options(selectinload(Opportunity.owner), selectinload(Opportunity.lead))
+          .order_by(Opportunity.updated_at.desc()))
     allowed = _allowed_owner_ids()
     if allowed is not None:
         qs = qs.filter(Opportunity.owner_id.in_(allowed))
@@ -6,7 +6,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required
 
 from ..platform_models import Tenant
-from .. import db
+from .. import db, invalidate_tenant_cache, dispose_tenant_engine
 from ..tenant_provision import provision_tenant
 
 platform_bp = Blueprint("platform", __name__, template_folder="../templates", url_prefix="/platform")
@@ -137,6 +137,7 @@ def tenants_new():
             flash(f"Tenant provisioning failed: {e}", "danger")
             return redirect(url_for("platform.tenants_new"))
 
+        invalidate_tenant_cache()
         flash("Tenant created & provisioned.", "success")
         return redirect(url_for("platform.tenants_list"))
 
@@ -149,6 +150,7 @@ def tenants_edit(tenant_id):
     tenant = Tenant.query.get_or_404(tenant_id)
 
     if request.method == "POST":
+        old_db_uri = tenant.db_uri
         tenant.name = request.form.get("name", "").strip()
         tenant.slug = request.form.get("slug", "").strip().lower()
         tenant.db_uri = request.form.get("db_uri", "").strip()
@@ -171,6 +173,9 @@ def tenants_edit(tenant_id):
                 return redirect(url_for("platform.tenants_edit", tenant_id=tenant.id))
 
         db.session.commit()
+        invalidate_tenant_cache()
+        if tenant.db_uri != old_db_uri:
+            dispose_tenant_engine(old_db_uri)
         flash("Tenant updated.", "success")
         return redirect(url_for("platform.tenants_list"))
 
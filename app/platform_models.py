@@ -1,4 +1,5 @@
 from datetime import datetime, date
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db
@@ -41,7 +42,8 @@ class PlatformAdmin(db.Model, UserMixin):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password, method="pbkdf2:sha256", salt_length=16)
+        method = current_app.config.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+        self.password_hash = generate_password_hash(password, method=method, salt_length=16)
 
     def check_password(self, password: str) -> bool:
         return check_password_hash(self.password_hash, password)
\ No newline at end of file
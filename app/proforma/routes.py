@@ -5,7 +5,8 @@ from sqlalchemy import or_
 
 from app import db
 from app.utils import require_perm
-from app.models import Quote, ProformaInvoice, QuoteItem, Opportunity, EmployeeProfile, Invoice, InvoicePayment
+from app.services.team import team_user_ids
+from app.models import Quote, ProformaInvoice, QuoteItem, Opportunity, Invoice, InvoicePayment
 
 
 proforma_bp = Blueprint("proforma", __name__, url_prefix="/proforma", template_folder="../templates")
@@ -15,22 +16,7 @@ proforma_bp = Blueprint("proforma", __name__, url_prefix="/proforma", template_f
 # Visibility helpers (same idea as quotes)
 # -------------------------
 def _team_user_ids(manager_user_id: int, include_self: bool = True):
-    seen = set([manager_user_id]) if include_self else set()
-    queue = [manager_user_id]
-
-    while queue:
-        mid = queue.pop(0)
-        rows = (
-            db.session.query(EmployeeProfile.user_id)
-            .filter(EmployeeProfile.reporting_manager_user_id == mid)
-            .all()
-        )
-        for (uid,) in rows:
-            if uid not in seen:
-                seen.add(uid)
-                queue.append(uid)
-
-    return list(seen)
+    return team_user_ids(manager_user_id, include_self=include_self)
 
 
 def _can_access_quote(q: Quote) -> bool:
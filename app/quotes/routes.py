@@ -11,6 +11,7 @@ from flask import (
 )
 from flask_login import login_required, current_user
 from sqlalchemy import func, or_, and_, case
+from sqlalchemy.orm import joinedload
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
@@ -21,11 +22,12 @@ from reportlab.lib.enums import TA_RIGHT
 
 from .. import db
 from ..utils import require_perm
+from ..services.team import team_user_ids
 from ..models import (
     Opportunity, Quote, QuoteItem, QuoteStatus,
     ApprovalRule, ApprovalRuleStep, QuoteApproval,
     Role, User, Client, ClientBranch, BranchContact,
-    EmployeeProfile, LeadService, ProformaInvoice, Invoice, Currency
+    LeadService, ProformaInvoice, Invoice, Currency
 )
 
 quotes_bp = Blueprint("quotes", __name__, template_folder="../templates")
@@ -94,23 +96,7 @@ def _team_user_ids(manager_user_id: int, include_self: bool = True):
     Returns a list of user_ids in the manager's reporting tree.
     include_self=True includes the manager_user_id in the returned list.
     """
-    seen = set([manager_user_id]) if include_self else set()
-    stack = [manager_user_id]
-
-    while stack:
-        mid = stack.pop()
-        rows = (
-            EmployeeProfile.query
-            .filter(EmployeeProfile.reporting_manager_user_id == mid)
-            .with_entities(EmployeeProfile.user_id)
-            .all()
-        )
-        for (uid,) in rows:
-            if uid is not None and uid not in seen:
-                seen.add(uid)
-                stack.append(uid)
-
-    return list(seen)
+    return team_user_ids(manager_user_id, include_self=include_self)
 
 
 def _allowed_sales_user_ids():
@@ -671,7 +657,9 @@ def approvals_inbox():
         else_=2,
     )
 
+    # each row shows quote + opportunity: load the chain with the approvals
     items = (QuoteApproval.query
+             .options(joinedload(QuoteApproval.quote).joinedload(Quote.opportunity))
              .filter(QuoteApproval.status.in_(statuses))
              .filter(assigned_filter)
              .order_by(status_order.asc(),
@@ -1,9 +1,32 @@
 from decimal import Decimal
+
+from flask import g
+
 from app.models import MarginSettings
+from app.utils import TTLCache
+
+# tenant slug -> threshold percent (refreshed on write via set_margin_threshold_cache)
+_THRESHOLD_CACHE = TTLCache(ttl=300)
+
+
+def active_margin_settings():
+    """The tenant's current settings row: the newest active one (None if there is none yet)."""
+    return (MarginSettings.query
+            .filter(MarginSettings.is_active == True)
+            .order_by(MarginSettings.id.desc())
+            .first())
+
 
 def get_margin_threshold_percent() -> Decimal:
-    ms = (MarginSettings.query
-          .filter(MarginSettings.is_active == True)
-          .order_by(MarginSettings.id.desc())
-          .first())
-    return Decimal(str(ms.threshold_percent)) if ms else Decimal("50.00")
\ No newline at end of file
+    slug = getattr(g, "tenant_slug", None)
+    th = _THRESHOLD_CACHE.get(slug)
+    if th is None:
+        ms = active_margin_settings()
+        th = Decimal(str(ms.threshold_percent)) if ms else Decimal("50.00")
+        _THRESHOLD_CACHE.set(slug, th)
+    return th
+
+
+def set_margin_threshold_cache(th: Decimal):
+    """Call after committing a new threshold for the current tenant."""
+    _THRESHOLD_CACHE.set(getattr(g, "tenant_slug", None), Decimal(str(th)))
@@ -0,0 +1,128 @@
+from flask import g, has_app_context
+from sqlalchemy import select, literal, event, func, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import EmployeeProfile, EmployeeClosure
+
+_closure = EmployeeClosure.__table__
+
+
+def rebuild_employee_closure(session=None):
+    """
+    Recompute employee_closure from employee_profiles: one DELETE plus one
+    INSERT .. SELECT over a recursive CTE. Used when a change closes a reporting
+    cycle, where the incremental update in _move_in_closure does not apply.
+    """
+    session = session or db.session
+    # a cycle would recurse forever; no real reporting path is longer than the profile count
+    max_depth = session.execute(select(func.count()).select_from(EmployeeProfile.__table__)).scalar() or 0
+
+    paths = (select(EmployeeProfile.reporting_manager_user_id.label("ancestor_id"),
+                    EmployeeProfile.user_id.label("descendant_id"),
+                    literal(1).label("depth"))
+             .where(EmployeeProfile.reporting_manager_user_id.isnot(None))
+             .cte("paths", recursive=True))
+    paths = paths.union_all(
+        select(paths.c.ancestor_id, EmployeeProfile.user_id, paths.c.depth + 1)
+        .join(paths, EmployeeProfile.reporting_manager_user_id == paths.c.descendant_id)
+        .where(paths.c.depth < max_depth)
+    )
+
+    session.execute(_closure.delete())
+    session.execute(_closure.insert().from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(paths.c.ancestor_id, paths.c.descendant_id, func.min(paths.c.depth))
+        .group_by(paths.c.ancestor_id, paths.c.descendant_id),
+    ))
+
+
+def _move_in_closure(session, user_id, manager_id):
+    """Re-hang user_id and everyone under them below manager_id (None = nobody)."""
+    current = session.execute(
+        select(_closure.c.ancestor_id)
+        .where(_closure.c.descendant_id == user_id, _closure.c.depth == 1)
+    ).scalar()
+    if current == manager_id:
+        return
+
+    subtree = dict(session.execute(
+        select(_closure.c.descendant_id, _closure.c.depth).where(_closure.c.ancestor_id == user_id)
+    ).all())
+    if user_id in subtree or manager_id == user_id or manager_id in subtree:
+        # the move closes (or an existing path already is) a reporting cycle
+        rebuild_employee_closure(session)
+        return
+    subtree[user_id] = 0
+
+    above = {}
+    if manager_id is not None:
+        above = dict(session.execute(
+            select(_closure.c.ancestor_id, _closure.c.depth).where(_closure.c.descendant_id == manager_id)
+        ).all())
+        above[manager_id] = 0
+
+    # every path into the subtree from outside runs through user_id's old manager
+    session.execute(_closure.delete().where(
+        _closure.c.descendant_id.in_(list(subtree)),
+        _closure.c.ancestor_id.notin_(list(subtree)),
+    ))
+    if above:
+        session.execute(_closure.insert(), [
+            {"ancestor_id": a, "descendant_id": d, "depth": a_depth + 1 + d_depth}
+            for a, a_depth in above.items()
+            for d, d_depth in subtree.items()
+        ])
+
+
+def _reporting_changes(session):
+    """(user_id, new manager id) for each profile whose place in the tree this flush changed."""
+    for obj in session.new:
+        if isinstance(obj, EmployeeProfile):
+            yield obj.user_id, obj.reporting_manager_user_id
+    for obj in session.dirty:
+        if isinstance(obj, EmployeeProfile) and \
+                inspect(obj).attrs.reporting_manager_user_id.history.has_changes():
+            yield obj.user_id, obj.reporting_manager_user_id
+    for obj in session.deleted:
+        if isinstance(obj, EmployeeProfile):
+            yield obj.user_id, None
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_employee_closure(session, flush_context):
+    # keep employee_closure in the same transaction as the profile write,
+    # and drop this request's memoized subtrees
+    changes = list(_reporting_changes(session))
+    if not changes:
+        return
+    for user_id, manager_id in changes:
+        _move_in_closure(session, user_id, manager_id)
+    if has_app_context():
+        g.pop("reporting_tree_ids", None)
+
+
+def reporting_tree_user_ids(head_user_id: int):
+    """
+    head + everyone reporting to them, at any depth: one primary-key range scan
+    of employee_closure (ancestor_id = head), memoized on g so repeated
+    visibility checks in the same request reuse it.
+    """
+    cache = g.setdefault("reporting_tree_ids", {})
+    if head_user_id in cache:
+        return list(cache[head_user_id])
+
+    below = db.session.execute(
+        select(_closure.c.descendant_id).where(_closure.c.ancestor_id == head_user_id)
+    ).scalars()
+    ids = (head_user_id,) + tuple(uid for uid in below if uid != head_user_id)
+    cache[head_user_id] = ids
+    return list(ids)
+
+
+def team_user_ids(manager_user_id: int, include_self: bool = True):
+    """Reporting tree under manager_user_id as a list; include_self adds the manager."""
+    ids = reporting_tree_user_ids(manager_user_id)
+    if include_self:
+        return ids
+    return [uid for uid in ids if uid != manager_user_id]
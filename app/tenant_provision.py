@@ -1,7 +1,6 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.orm import sessionmaker
-from werkzeug.security import generate_password_hash
 
 from . import db
 from .models import Role, Permission, User
@@ -89,9 +88,7 @@ def provision_tenant(db_uri: str, admin_email: str, admin_name: str, admin_passw
         user = session.query(User).filter_by(email=admin_email).first()
         if not user:
             user = User(email=admin_email, name=admin_name, is_active=True, auth_provider="LOCAL")
-            user.password_hash = generate_password_hash(
-                admin_password, method="pbkdf2:sha256", salt_length=16
-            )
+            user.set_password(admin_password)
             user.role = admin_role
             session.add(user)
 
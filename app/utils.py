@@ -1,5 +1,6 @@
+import time
 from functools import wraps
-from flask import abort
+from flask import abort, g
 from flask_login import current_user
 
 def require_perm(code: str):
@@ -12,4 +13,63 @@ def require_perm(code: str):
                 abort(403)
             return fn(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+def is_duplicate_key(exc) -> bool:
+    """
+    True when an IntegrityError is a unique-key violation (MySQL 1062, SQLite
+    "UNIQUE constraint failed"), not e.g. a foreign-key or NOT NULL failure.
+    """
+    orig = getattr(exc, "orig", None)
+    args = getattr(orig, "args", None) or (None,)
+    return args[0] == 1062 or "UNIQUE constraint failed" in str(orig)
+
+def request_memo(fn):
+    """
+    Memoize fn(owner_ids, ...) for the rest of the current request (stored on g).
+    Key is the function name + owner id set + remaining args, so the same KPI
+    for the same owners is only queried once per page.
+    """
+    @wraps(fn)
+    def wrapper(owner_ids, *args, **kwargs):
+        memo = g.setdefault("_request_memo", {})
+        key = (fn.__qualname__, frozenset(owner_ids), args, tuple(sorted(kwargs.items())))
+        if key not in memo:
+            memo[key] = fn(owner_ids, *args, **kwargs)
+        return memo[key]
+    return wrapper
+
+class TTLCache:
+    """
+    Tiny process-local cache with per-entry expiry.
+    Each worker keeps its own copy, so writers should call clear()/pop()
+    and the TTL bounds staleness in the other workers.
+    """
+
+    def __init__(self, ttl: int = 60, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+
+    def get(self, key, default=None):
+        hit = self._data.get(key)
+        if hit is None:
+            return default
+        expires_at, value = hit
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return default
+        return value
+
+    def set(self, key, value):
+        if len(self._data) >= self.maxsize:
+            self._data.clear()
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def pop(self, key, default=None):
+        hit = self._data.pop(key, None)
+        return hit[1] if hit else default
+
+    def clear(self):
+        self._data.clear()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,4 +17,11 @@ class Config:
     }
 
     BASE_DOMAIN = os.getenv("BASE_DOMAIN", "localhost")
-    DEFAULT_TENANT_SLUG = os.getenv("DEFAULT_TENANT_SLUG", None)
\ No newline at end of file
+    DEFAULT_TENANT_SLUG = os.getenv("DEFAULT_TENANT_SLUG", None)
+
+    # werkzeug hash method for local passwords, e.g. "pbkdf2:sha256:600000" or "scrypt:32768:8:1";
+    # existing hashes keep verifying, the method is stored in each hash
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+
+    # report PDFs are rendered in a background thread and parked here until downloaded
+    REPORT_PDF_DIR = os.getenv("REPORT_PDF_DIR", os.path.join(tempfile.gettempdir(), "crystal_nexus_pdf"))
@@ -0,0 +1,38 @@
+"""users FULLTEXT search index
+
+ALTER TABLE users ADD FULLTEXT ix_users_search (name, email)
+
+create_all() builds it on new databases; this adds it to existing MySQL ones
+(run once per tenant database). Skipped when the index is already there.
+
+Revision ID: 3c7e1f0a9b21
+Revises: 
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7e1f0a9b21'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_search_index():
+    indexes = sa.inspect(op.get_bind()).get_indexes("users")
+    return any(ix["name"] == "ix_users_search" for ix in indexes)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "mysql" or _has_search_index():
+        return
+    op.execute("ALTER TABLE users ADD FULLTEXT ix_users_search (name, email)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "mysql" or not _has_search_index():
+        return
+    op.drop_index("ix_users_search", table_name="users")
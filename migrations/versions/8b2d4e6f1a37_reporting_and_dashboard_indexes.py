@@ -0,0 +1,57 @@
+"""reporting and dashboard indexes
+
+The indexes declared in the models' __table_args__ / index=True. create_all()
+builds them on new databases; this adds them to existing ones (run once per
+tenant database). Each one is skipped when it is already there.
+
+Revision ID: 8b2d4e6f1a37
+Revises: 3c7e1f0a9b21
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4e6f1a37'
+down_revision = '3c7e1f0a9b21'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns)
+INDEXES = (
+    # cluster reports
+    ("ix_invoice_date_status", "invoices", ["invoice_date", "status"]),
+    ("ix_project_created_am", "projects", ["created_at", "account_manager_user_id"]),
+    ("ix_employee_profiles_reporting_manager_user_id", "employee_profiles", ["reporting_manager_user_id"]),
+    ("ix_payment_status", "payment_collections", ["status"]),
+    # sidebar / menu management
+    ("ix_menu_active_sort", "menus", ["is_active", "sort_order"]),
+    ("ix_submenu_menu_active_sort", "submenus", ["menu_id", "is_active", "sort_order"]),
+    # dashboards: owner set + sort / group column
+    ("ix_lead_owner_created", "leads", ["owner_id", "created_at"]),
+    ("ix_lead_owner_status", "leads", ["owner_id", "status_id"]),
+    ("ix_lead_activity_follow_up", "lead_activities", ["next_follow_up_at", "lead_id"]),
+    ("ix_opp_owner_created", "opportunities", ["owner_id", "created_at"]),
+    ("ix_opp_owner_close_date", "opportunities", ["owner_id", "expected_close_date"]),
+    ("ix_quote_creator_status", "quotes", ["created_by_id", "status_id"]),
+    ("ix_payment_creator_created", "payment_collections", ["created_by_id", "created_at"]),
+)
+
+
+def _existing_indexes(table):
+    return {ix["name"] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _columns in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
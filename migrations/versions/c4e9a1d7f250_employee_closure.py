@@ -0,0 +1,61 @@
+"""employee_closure reporting tree
+
+Adds employee_closure (ancestor_id, descendant_id, depth) and seeds it from
+employee_profiles.reporting_manager_user_id with one recursive INSERT .. SELECT.
+From then on services.team keeps it in step with every EmployeeProfile flush.
+Skipped when the table is already there (create_all builds it on new databases).
+
+Revision ID: c4e9a1d7f250
+Revises: 8b2d4e6f1a37
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e9a1d7f250'
+down_revision = '8b2d4e6f1a37'
+branch_labels = None
+depends_on = None
+
+
+def _has_closure_table():
+    return sa.inspect(op.get_bind()).has_table("employee_closure")
+
+
+def upgrade():
+    if _has_closure_table():
+        return
+    op.create_table(
+        "employee_closure",
+        sa.Column("ancestor_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("descendant_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("ancestor_id", "descendant_id"),
+    )
+
+    # a reporting cycle would recurse forever; no real path is longer than the profile count
+    max_depth = op.get_bind().execute(sa.text("SELECT COUNT(*) FROM employee_profiles")).scalar() or 0
+    op.get_bind().execute(sa.text("""
+        INSERT INTO employee_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS (
+            SELECT reporting_manager_user_id, user_id, 1
+            FROM employee_profiles
+            WHERE reporting_manager_user_id IS NOT NULL
+            UNION ALL
+            SELECT paths.ancestor_id, employee_profiles.user_id, paths.depth + 1
+            FROM employee_profiles
+            JOIN paths ON employee_profiles.reporting_manager_user_id = paths.descendant_id
+            WHERE paths.depth < :max_depth
+        )
+        SELECT ancestor_id, descendant_id, MIN(depth)
+        FROM paths
+        GROUP BY ancestor_id, descendant_id
+    """), {"max_depth": max_depth})
+
+
+def downgrade():
+    if _has_closure_table():
+        op.drop_table("employee_closure")